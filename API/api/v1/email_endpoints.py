@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import ORJSONResponse
 from core.utils import create_email_message, send_email, validate_email, get_api_key
 from core.rate_limiter import rate_limiter
+from core.jobs import JobQueue
 
 router = APIRouter()
 
@@ -12,17 +13,42 @@ class EmailRequest(BaseModel):
     from_user: str = "noreply"
     subject: str
 
+def deliver_email(payload: dict) -> None:
+    """Job handler, sends one message to every recipient in a single transaction. Only the recipients the
+    server refused are kept in the payload, so a retry only sends to them"""
+    message = create_email_message(from_user=payload["from_user"], subject=payload["subject"], msg=payload["message"])
+    refused = send_email(message, payload["to_users"])
+    payload["to_users"] = list(refused)
+    if refused:
+        raise RuntimeError(f"Refused recipients: {', '.join(refused)}")
+
+email_queue = JobQueue("email", deliver_email)
+
 @router.post('/send', response_class=ORJSONResponse)
 @rate_limiter(max_requests_per_second=1, max_requests_per_day=50)
 async def send_email_endpoint(request: Request, email_request: EmailRequest, user=Depends(get_api_key)):
-    """Sends an email using smtplib"""
+    """Queues an email, it is sent in the background, poll /email/status/{job_id} for the outcome"""
     try:
         if len(email_request.to_users) > 10:
             raise HTTPException(status_code=400, detail="Cannot send more than 10 emails at a time")
-        for user in email_request.to_users:
-            if validate_email(user):
-                message = create_email_message(from_user=email_request.from_user, subject=email_request.subject, msg=email_request.message)
-                send_email(message, user)
-        return ORJSONResponse(content={"message": "Email sent successfully"}, status_code=200)
+        to_users = [to_user for to_user in email_request.to_users if validate_email(to_user)]
+        if not to_users:
+            raise HTTPException(status_code=400, detail="No valid email address")
+        job_id = await email_queue.enqueue({
+            "from_user": email_request.from_user,
+            "subject": email_request.subject,
+            "message": email_request.message,
+            "to_users": to_users
+        }, owner=user["_id"])
+        return ORJSONResponse(content={"message": "Email queued", "job_id": job_id}, status_code=202)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send Email: {str(e)}")
+
+@router.get('/status/{job_id}', response_class=ORJSONResponse)
+async def email_status_endpoint(job_id: str, user=Depends(get_api_key)):
+    status = await email_queue.status(job_id, owner=user["_id"])
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ORJSONResponse(content=status, status_code=200)
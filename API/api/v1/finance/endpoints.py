@@ -1,12 +1,16 @@
+import asyncio
+from typing import Union
 from datetime import datetime
 import pandas as pd
 import yfinance as yf
 from fastapi import APIRouter, Request, HTTPException, Query, Path
 from fastapi.responses import ORJSONResponse
+from core.config import FinanceConfig
 from core.rate_limiter import rate_limiter
-from .functions import (verify_ticker, validate_column, main_stock_data, calculate_period_change,
+from core.executors import executors
+from .functions import (verify_ticker, get_quotes, validate_column, main_stock_data, calculate_period_change,
                         stock_data_format_json, stock_data_format_excel, stock_data_format_csv, stock_data_format_html,
-                        Format, Interval, ValidColumns)
+                        stock_data_format_ndjson, stock_data_format_parquet, stock_data_format_arrow, ticker_info, Compression, Format, Interval, ValidColumns)
 
 router = APIRouter()
 
@@ -14,35 +18,57 @@ router = APIRouter()
 @rate_limiter(max_requests_per_second=1, max_requests_per_day=200)
 async def get_general_info(request: Request, ticker: str) -> ORJSONResponse:
     """Returns general information about a company."""
-    data = verify_ticker(ticker)
-    info = data.info
+    data = await verify_ticker(ticker)
+    info = await executors.run_thread("yfinance", ticker_info, data)
     return ORJSONResponse(content=info, status_code=200)
 
 @router.get("/current-value", response_class=ORJSONResponse)
 @rate_limiter(max_requests_per_second=1, max_requests_per_day=200)
 async def get_value(request: Request, ticker: str) -> ORJSONResponse:
     """Returns current value of a company's stock."""
-    data = verify_ticker(ticker)
-    current_price = data.history(period="1d")['Close'].iloc[-1]
+    data = await verify_ticker(ticker)
+    history, info = await asyncio.gather(executors.run_thread("yfinance", data.history, "1d"),
+                                         executors.run_thread("yfinance", ticker_info, data))
+    current_price = history['Close'].iloc[-1]
     information: dict = {
         "current_value": current_price,
         "info": {
             "ticker": ticker,
-            "company": data.info.get("longName", "N/A"),
-            "currency": data.info.get("currency", "N/A"),
+            "company": info.get("longName", "N/A"),
+            "currency": info.get("currency", "N/A"),
             "date": datetime.now().strftime("%d-%m-%Y, %H:%M:%S")
         }
     }
     return ORJSONResponse(content=information, status_code=200)
 
+@router.get("/quotes", response_class=ORJSONResponse)
+@rate_limiter(max_requests_per_second=1, max_requests_per_day=200)
+async def get_quotes_endpoint(
+    request: Request,
+    tickers: str = Query(..., description=f"Comma-separated list of up to {FinanceConfig.MAX_BATCH_TICKERS} ticker symbols")) -> ORJSONResponse:
+    """Returns the current value of many stocks at once, symbols that could not be found are listed under errors."""
+    symbols: list[str] = list(dict.fromkeys(symbol.strip().upper() for symbol in tickers.split(',') if symbol.strip()))
+    if not symbols:
+        raise HTTPException(status_code=400, detail={"error": "No ticker symbols provided"})
+    if len(symbols) > FinanceConfig.MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail={"error": f"Cannot request more than {FinanceConfig.MAX_BATCH_TICKERS} tickers at a time"})
+
+    quotes: dict[str, dict] = await get_quotes(symbols)
+    information: dict = {
+        "quotes": {symbol: quote for symbol, quote in quotes.items() if "error" not in quote},
+        "errors": {symbol: quote["error"] for symbol, quote in quotes.items() if "error" in quote}
+    }
+    return ORJSONResponse(content=information, status_code=200)
+
 @router.get("/currency-convert", response_class=ORJSONResponse)
 @rate_limiter(max_requests_per_second=1, max_requests_per_day=200)
 async def get_exchange_rate(request: Request, from_curr: str, to_curr: str, amount: float = 1):
     """Currency converter, provide from currency (from_curr) to currency (to_curr) and an amount to convert (default is 1)."""
     data = yf.Ticker(f'{from_curr.upper()}{to_curr.upper()}=X')
-    if data.history(period="1d").empty:
+    history = await executors.run_thread("yfinance", data.history, "1d")
+    if history.empty:
         raise HTTPException(status_code=404, detail={"error": f"Could not find exchange rate for {from_curr}/{to_curr}"})
-    result = data.history(period="1d")["Close"].iloc[-1] * amount
+    result = history["Close"].iloc[-1] * amount
     information = {
         "result": result,
         "info": {
@@ -54,21 +80,12 @@ async def get_exchange_rate(request: Request, from_curr: str, to_curr: str, amou
     }
     return ORJSONResponse(content=information, status_code=200)
 
-@router.get("/stock-data.{format}")
-@rate_limiter(max_requests_per_second=1, max_requests_per_day=100)
-async def get_stock_data(
-    request: Request,
-    format: Format = Path(..., description="The format in which to retrieve the stock data"),
-    ticker: str = Query(..., description="The stock ticker symbol"),
-    start: str = Query(..., description="The start date in dd-mm-yyyy format"),
-    end: str = Query(None, description="The end date in dd-mm-yyyy format. Defaults to today if not provided"),
-    interval: Interval = Query(Interval.ONE_DAY, description="The interval for the stock data"),
-    columns: str = Query(None, description=f"""Comma-separated list of lower case columns to export possibe columns: 
-                         high, low, open, close, dividends, volume, stock splits and change. Leave empty to get all the columns.""")):
-    """Fetch stock data for a given ticker and date range."""
-    verified_ticker: yf.Ticker = verify_ticker(ticker)
+async def _stock_frame(ticker: str, start: str, end: Union[str, None], interval: Interval, columns: Union[str, None]) -> tuple[yf.Ticker, pd.DataFrame]:
+    """The verified ticker and its history with the selected columns, ready to export"""
+    verified_ticker: yf.Ticker = await verify_ticker(ticker)
 
-    data: pd.DataFrame = main_stock_data(verified_ticker, start, end, interval)
+    # Ranges missing from the history store are downloaded from Yahoo
+    data: pd.DataFrame = await executors.run_thread("yfinance", main_stock_data, ticker, start, end, interval)
 
     selected_columns: list[str] = validate_column(columns)
 
@@ -81,14 +98,48 @@ async def get_stock_data(
     data = data.round(2)
     data['Date'] = pd.to_datetime(data['Date'])
     data['Date'] = data['Date'].dt.strftime('%d-%m-%Y')
+    return verified_ticker, data
+
+@router.get("/stock-data.{format}")
+@rate_limiter(max_requests_per_second=1, max_requests_per_day=100)
+async def get_stock_data(
+    request: Request,
+    format: Format = Path(..., description="The format in which to retrieve the stock data"),
+    ticker: str = Query(..., description=f"""The stock ticker symbol, the excel format also takes a comma-separated list of up to 
+                        {FinanceConfig.MAX_BATCH_TICKERS} symbols and exports each one to its own sheet"""),
+    start: str = Query(..., description="The start date in dd-mm-yyyy format"),
+    end: str = Query(None, description="The end date in dd-mm-yyyy format. Defaults to today if not provided"),
+    interval: Interval = Query(Interval.ONE_DAY, description="The interval for the stock data"),
+    columns: str = Query(None, description=f"""Comma-separated list of lower case columns to export possibe columns: 
+                         high, low, open, close, dividends, volume, stock splits and change. Leave empty to get all the columns."""),
+    compression: Compression = Query(None, description="""Compression codec for the parquet (default snappy) and arrow (default none, only lz4 and zstd are supported) formats""")):
+    """Fetch stock data for a given ticker and date range."""
+    tickers: list[str] = list(dict.fromkeys(symbol.strip().upper() for symbol in ticker.split(',') if symbol.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail={"error": "No ticker symbols provided"})
+    if len(tickers) > 1 and format != Format.excel:
+        raise HTTPException(status_code=400, detail={"error": "Only the excel format supports more than one ticker"})
+    if len(tickers) > FinanceConfig.MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail={"error": f"Cannot request more than {FinanceConfig.MAX_BATCH_TICKERS} tickers at a time"})
+
+    frames = await asyncio.gather(*(_stock_frame(symbol, start, end, interval, columns) for symbol in tickers))
+    ticker = tickers[0]
+    verified_ticker, data = frames[0]
 
     format = format.value
     
     if format == Format.json.value:
-        return stock_data_format_json(data=data, ticker=verified_ticker, interval=interval.value, start=start, end=end)
+        return await stock_data_format_json(data=data, ticker=verified_ticker, interval=interval.value, start=start, end=end)
     elif format == Format.excel.value:
-        return stock_data_format_excel(data=data, ticker=ticker, interval=interval.value, start=start, end=end)
+        sheets = {symbol: sheet_data for symbol, (_, sheet_data) in zip(tickers, frames)}
+        return await stock_data_format_excel(sheets=sheets, interval=interval.value, start=start, end=end)
     elif format == Format.csv.value:
         return stock_data_format_csv(data=data, ticker=ticker, interval=interval.value, start=start, end=end)
     elif format == Format.html.value:
-        return stock_data_format_html(data=data)
\ No newline at end of file
+        return await stock_data_format_html(data=data)
+    elif format == Format.ndjson.value:
+        return stock_data_format_ndjson(data=data, ticker=ticker, interval=interval.value, start=start, end=end)
+    elif format == Format.parquet.value:
+        return await stock_data_format_parquet(data=data, ticker=ticker, interval=interval.value, start=start, end=end, compression=compression)
+    elif format == Format.arrow.value:
+        return await stock_data_format_arrow(data=data, ticker=ticker, interval=interval.value, start=start, end=end, compression=compression)
\ No newline at end of file
@@ -1,13 +1,24 @@
-import io
+import os
+import asyncio
+import tempfile
+import threading
 from enum import Enum
-from typing import Union
-from datetime import datetime
+from typing import BinaryIO, Iterator, Union
+from datetime import datetime, date
+import numpy as np
 import pandas as pd
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yfinance as yf
 from fastapi import HTTPException
-from fastapi.responses import ORJSONResponse, StreamingResponse, HTMLResponse
-from cachetools import cached
+from fastapi.responses import ORJSONResponse, StreamingResponse, HTMLResponse, Response
+from cachetools import cached, TLRUCache, TTLCache
+from core.config import FinanceConfig
 from core.utils import str_to_date, get_current_date, cache
+from core.singleflight import SingleFlight
+from core.executors import executors
+from .store import HistoryStore
 
 # ---------------------------------------------------------------- Enums ----------------------------------------------------------------
 
@@ -16,6 +27,17 @@ class Format(Enum):
     csv = "csv"
     html = "html"
     excel = "excel"
+    ndjson = "ndjson"
+    parquet = "parquet"
+    arrow = "arrow"
+
+class Compression(Enum):
+    NONE = "none"
+    SNAPPY = "snappy"
+    GZIP = "gzip"
+    BROTLI = "brotli"
+    ZSTD = "zstd"
+    LZ4 = "lz4"
 
 class ValidColumns(Enum):
     DATE = 'date'
@@ -44,13 +66,87 @@ class Interval(Enum):
 
 # ---------------------------------------------------------------- Functions ----------------------------------------------------------------
 
-@cached(cache)
-def verify_ticker(ticker: str) -> yf.Ticker:
+_verify_ticker_flight = SingleFlight("verify_ticker")
+
+@cached(cache, lock=threading.Lock())
+def _verify_ticker(ticker: str) -> yf.Ticker:
     data = yf.Ticker(ticker)
     if not data.history(period="1d").empty:
         return data
     raise HTTPException(status_code=400, detail={"error": f"Could not find stock symbol {ticker}"})
 
+async def verify_ticker(ticker: str) -> yf.Ticker:
+    # yf.Ticker objects can't be shared through Redis, so calls are only coalesced inside the worker
+    return await _verify_ticker_flight.do(ticker, lambda: executors.run_thread("yfinance", _verify_ticker, ticker))
+
+# -------------------------- /quotes enpoint functions --------------------------------
+
+quote_cache = TTLCache(maxsize=FinanceConfig.QUOTE_CACHE_SIZE, ttl=FinanceConfig.QUOTE_TTL)
+_pending_quotes: dict[str, asyncio.Future] = {}
+# Downloads in flight, referenced so they are not garbage collected while no request waits on them
+_quote_downloads: set[asyncio.Task] = set()
+
+def _download_quotes(symbols: list[str]) -> dict[str, dict]:
+    """Latest close of every symbol from a single bulk download"""
+    data: pd.DataFrame = yf.download(symbols, period="1d", group_by="ticker", progress=False, threads=True)
+    quotes = {}
+    for symbol in symbols:
+        grouped = isinstance(data.columns, pd.MultiIndex)
+        if data.empty or (grouped and symbol not in data.columns.get_level_values(0)):
+            quotes[symbol] = {"error": f"Could not find stock symbol {symbol}"}
+            continue
+        closes = (data[symbol] if grouped else data)['Close'].dropna()
+        if closes.empty:
+            quotes[symbol] = {"error": f"Could not find stock symbol {symbol}"}
+        else:
+            quotes[symbol] = {"current_value": float(closes.iloc[-1]), "date": datetime.now().strftime("%d-%m-%Y, %H:%M:%S")}
+    return quotes
+
+async def _resolve_quotes(futures: dict[str, asyncio.Future]) -> None:
+    """Downloads the symbols and resolves their futures, always with a quote or a per-symbol error.
+    Runs detached from the request that started it so its cancellation never strands the others waiting"""
+    symbols = list(futures)
+    try:
+        try:
+            downloaded = await executors.run_thread("yfinance", _download_quotes, symbols)
+        except Exception as e:
+            downloaded = {symbol: {"error": f"Could not get the quote for {symbol}: {e}"} for symbol in symbols}
+        else:
+            quote_cache.update((symbol, quote) for symbol, quote in downloaded.items() if "error" not in quote)
+        for symbol, future in futures.items():
+            future.set_result(downloaded[symbol])
+    finally:
+        for symbol in symbols:
+            _pending_quotes.pop(symbol, None)
+        # Only left unresolved when the download itself is cancelled (shutdown)
+        for future in futures.values():
+            future.cancel()
+
+async def get_quotes(symbols: list[str]) -> dict[str, dict]:
+    """Quotes for the symbols, served from the cache or joined to an in-flight download when possible"""
+    quotes, waiting, missing = {}, {}, []
+    for symbol in symbols:
+        if symbol in quote_cache:
+            quotes[symbol] = quote_cache[symbol]
+        elif symbol in _pending_quotes:
+            waiting[symbol] = _pending_quotes[symbol]
+        else:
+            missing.append(symbol)
+
+    if missing:
+        loop = asyncio.get_running_loop()
+        futures = {symbol: loop.create_future() for symbol in missing}
+        _pending_quotes.update(futures)
+        waiting.update(futures)
+        task = asyncio.create_task(_resolve_quotes(futures))
+        _quote_downloads.add(task)
+        task.add_done_callback(_quote_downloads.discard)
+
+    for symbol, future in waiting.items():
+        # Shielded so a cancelled request does not cancel the download for the other requests waiting on it
+        quotes[symbol] = await asyncio.shield(future)
+    return quotes
+
 # -------------------------- /stock-data enpoint functions --------------------------------
 
 def validate_dates(start: str, end: str) -> None:
@@ -83,14 +179,25 @@ def validate_column(columns: Union[str, None]) -> list[str]:
     selected_columns.insert(0, 'Date')
     return selected_columns
 
-@cached(cache)
-def main_stock_data(ticker: yf.Ticker, start: str, end: str, interval: Interval) -> pd.DataFrame:
+def _history_ttu(key: tuple, value: pd.DataFrame, now: float) -> float:
+    """Ranges that include today are still changing and expire quickly, past ranges are final"""
+    _, _, end, _ = key
+    if end is None or str_to_date(end).date() >= date.today():
+        return now + FinanceConfig.LIVE_HISTORY_TTL
+    return now + FinanceConfig.PAST_HISTORY_TTL
+
+history_cache = TLRUCache(maxsize=FinanceConfig.HISTORY_CACHE_SIZE, ttu=_history_ttu)
+history_store = HistoryStore(FinanceConfig.HISTORY_STORE_DIR)
+
+# Filled from the yfinance worker threads
+@cached(history_cache, key=lambda symbol, start, end, interval: (symbol, start, end, interval), lock=threading.Lock())
+def _stock_history(symbol: str, start: str, end: Union[str, None], interval: Interval) -> pd.DataFrame:
     validate_dates(start, end)
     
     start_date = str_to_date(start)
     end_date = str_to_date(end)
     
-    data: pd.DataFrame = ticker.history(start=start_date, end=end_date, interval=interval.value)
+    data: pd.DataFrame = history_store.get(symbol, interval.value, start_date.date(), end_date.date())
     if data.empty:
         raise HTTPException(status_code=404, detail={"error": "No data found for the given period"})
     
@@ -98,34 +205,39 @@ def main_stock_data(ticker: yf.Ticker, start: str, end: str, interval: Interval)
     data['Date'] = pd.to_datetime(data['Date']).dt.date
     return data
 
+def main_stock_data(symbol: str, start: str, end: Union[str, None], interval: Interval) -> pd.DataFrame:
+    """Returns a shallow copy of the cached history, callers may add or replace whole columns (which never
+    reaches the cache) but must not write into the existing ones in place"""
+    return _stock_history(symbol.upper(), start, end, interval).copy(deep=False)
+
 
 def calculate_period_change(data: pd.DataFrame) -> pd.DataFrame:
-    previous_close = data.iloc[0]['Close']
-    initial_close = previous_close
-    data['Interval Change (%)'] = 0.0
-    data['Total Change (%)'] = 0.0
-    
-    for i in range(1, len(data)):
-        current_close = data.iloc[i]['Close']
+    close = data['Close'].to_numpy(dtype=np.float64)
 
-        period_growth = ((current_close - previous_close) / previous_close) * 100
-        data.at[data.index[i], 'Interval Change (%)'] = period_growth
+    # Change from the previous row and from the first row in percent, the first row has no change
+    interval_change = np.zeros(len(close))
+    interval_change[1:] = ((close[1:] - close[:-1]) / close[:-1]) * 100
 
-        total_growth = ((current_close - initial_close) / initial_close) * 100
-        data.at[data.index[i], 'Total Change (%)'] = total_growth
+    total_change = ((close - close[0]) / close[0]) * 100
+    total_change[0] = 0.0
 
-        previous_close = current_close
-    
+    data['Interval Change (%)'] = interval_change
+    data['Total Change (%)'] = total_change
     return data
 
 # --------------------------------------- Stock Data Formats ---------------------------------------
-def stock_data_format_json(data: pd.DataFrame, ticker: yf.Ticker, interval: str, start: str, end: Union[str, None]) -> ORJSONResponse:
+def ticker_info(ticker: yf.Ticker) -> dict:
+    """Company information, fetched by yfinance on first use, call it from a worker thread"""
+    return ticker.info
+
+async def stock_data_format_json(data: pd.DataFrame, ticker: yf.Ticker, interval: str, start: str, end: Union[str, None]) -> ORJSONResponse:
     stock_data = data.to_dict(orient='records')
+    info = await executors.run_thread("yfinance", ticker_info, ticker)
     information = {
         "info": {
-            "ticker": ticker.info.get("symbol", "N/A"),
-            "company": ticker.info.get("longName", "N/A"),
-            "currency": ticker.info.get("currency", "N/A"),
+            "ticker": info.get("symbol", "N/A"),
+            "company": info.get("longName", "N/A"),
+            "currency": info.get("currency", "N/A"),
             "interval": interval,
             "start_date": start,
             "end_date": end or get_current_date(),
@@ -134,31 +246,130 @@ def stock_data_format_json(data: pd.DataFrame, ticker: yf.Ticker, interval: str,
     }
     return ORJSONResponse(content=information, status_code=200)
 
-def stock_data_format_excel(data: pd.DataFrame, ticker: str, interval: str, start: str, end: Union[str, None]) -> StreamingResponse:
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        data.to_excel(writer, index=False, sheet_name='Sheet1')
-    output.seek(0)
-    filename = f'{ticker}_{start}-{end or get_current_date()}-{interval}.xlsx'
+def _write_excel(sheets: dict[str, pd.DataFrame]) -> str:
+    """Writes every frame to its own sheet of a new workbook file and returns its path.
+
+    openpyxl's write-only mode streams the rows of each sheet to disk as they are appended, so memory stays
+    flat however long the history is, and the rows go in as plain Python values in chunks instead of one
+    cell object at a time.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    for name, data in sheets.items():
+        sheet = workbook.create_sheet(title=name[:31])
+        sheet.append(list(data.columns))
+        for chunk in _iter_row_chunks(data):
+            for row in zip(*(chunk[column].tolist() for column in chunk.columns)):
+                sheet.append(row)
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            workbook.save(file)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+# Bytes read at a time when streaming an export file
+_FILE_CHUNK_BYTES = 64 * 1024
+
+def _iter_file(file: BinaryIO) -> Iterator[bytes]:
+    with file:
+        while chunk := file.read(_FILE_CHUNK_BYTES):
+            yield chunk
+
+async def stock_data_format_excel(sheets: dict[str, pd.DataFrame], interval: str, start: str, end: Union[str, None]) -> StreamingResponse:
+    """One sheet per ticker, written by a worker process to a temporary file that is streamed back"""
+    # openpyxl is pure Python and would hold the GIL for the whole export
+    path = await executors.run_process("excel", _write_excel, sheets)
+    file = open(path, 'rb')
+    # Unlinked right away, the open file is all that is left and it goes away once it is closed
+    os.remove(path)
+    filename = f'{"_".join(sheets)}_{start}-{end or get_current_date()}-{interval}.xlsx'
     return StreamingResponse(
-        output,
+        _iter_file(file),
         media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f'attachment; filename={filename}'}
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'Content-Length': str(os.fstat(file.fileno()).st_size)}
     )
 
+def _iter_row_chunks(data: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(data), FinanceConfig.EXPORT_CHUNK_ROWS):
+        yield data.iloc[start:start + FinanceConfig.EXPORT_CHUNK_ROWS]
+
+def _iter_csv(data: pd.DataFrame) -> Iterator[str]:
+    yield data.iloc[:0].to_csv(index=False)
+    for chunk in _iter_row_chunks(data):
+        yield chunk.to_csv(index=False, header=False)
+
+def _iter_ndjson(data: pd.DataFrame) -> Iterator[str]:
+    for chunk in _iter_row_chunks(data):
+        yield chunk.to_json(orient='records', lines=True)
+
 def stock_data_format_csv(data: pd.DataFrame, ticker: str, interval: str, start: str, end: Union[str, None]) -> StreamingResponse:
-    csv_buffer = io.StringIO()
-    data.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)
     filename = f'{ticker}_{start}-{end or get_current_date()}-{interval}.csv'
     return StreamingResponse(
-        csv_buffer,
+        _iter_csv(data),
         media_type='text/csv',
         headers={'Content-Disposition': f'attachment;filename={filename}'}
     )
 
-def stock_data_format_html(data: pd.DataFrame) -> HTMLResponse:
-    html_content = data.to_html(index=False)
+def stock_data_format_ndjson(data: pd.DataFrame, ticker: str, interval: str, start: str, end: Union[str, None]) -> StreamingResponse:
+    filename = f'{ticker}_{start}-{end or get_current_date()}-{interval}.ndjson'
+    return StreamingResponse(
+        _iter_ndjson(data),
+        media_type='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment;filename={filename}'}
+    )
+
+# Arrow IPC streams only support these codecs
+ARROW_COMPRESSIONS = (Compression.NONE, Compression.LZ4, Compression.ZSTD)
+
+def _to_arrow_table(data: pd.DataFrame) -> pa.Table:
+    # Numeric columns are wrapped without copying
+    return pa.Table.from_pandas(data, preserve_index=False)
+
+def _to_parquet(data: pd.DataFrame, compression: Compression) -> bytes:
+    sink = pa.BufferOutputStream()
+    pq.write_table(_to_arrow_table(data), sink, compression=compression.value)
+    return sink.getvalue().to_pybytes()
+
+def _to_arrow_stream(data: pd.DataFrame, compression: Compression) -> bytes:
+    table = _to_arrow_table(data)
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == Compression.NONE else compression.value)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=FinanceConfig.EXPORT_CHUNK_ROWS)
+    return sink.getvalue().to_pybytes()
+
+async def stock_data_format_parquet(data: pd.DataFrame, ticker: str, interval: str, start: str, end: Union[str, None],
+                                    compression: Union[Compression, None]) -> Response:
+    compression = compression or Compression.SNAPPY
+    # pyarrow encodes and compresses without the GIL
+    content = await executors.run_thread("arrow", _to_parquet, data, compression)
+    filename = f'{ticker}_{start}-{end or get_current_date()}-{interval}.parquet'
+    return Response(
+        content=content,
+        media_type='application/vnd.apache.parquet',
+        headers={'Content-Disposition': f'attachment;filename={filename}'}
+    )
+
+async def stock_data_format_arrow(data: pd.DataFrame, ticker: str, interval: str, start: str, end: Union[str, None],
+                                  compression: Union[Compression, None]) -> Response:
+    compression = compression or Compression.NONE
+    if compression not in ARROW_COMPRESSIONS:
+        raise HTTPException(status_code=400, detail={"error": f"Arrow streams support only {', '.join(c.value for c in ARROW_COMPRESSIONS)} compression"})
+    content = await executors.run_thread("arrow", _to_arrow_stream, data, compression)
+    filename = f'{ticker}_{start}-{end or get_current_date()}-{interval}.arrows'
+    return Response(
+        content=content,
+        media_type='application/vnd.apache.arrow.stream',
+        headers={'Content-Disposition': f'attachment;filename={filename}'}
+    )
+
+def _to_html(data: pd.DataFrame) -> str:
+    return data.to_html(index=False)
+
+async def stock_data_format_html(data: pd.DataFrame) -> HTMLResponse:
+    html_content = await executors.run_process("html", _to_html, data)
     html_content = f"""
     <html>
     <head>
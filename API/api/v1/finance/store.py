@@ -0,0 +1,147 @@
+import os
+import json
+import threading
+from datetime import date, timedelta
+from typing import Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yfinance as yf
+
+_RANGES_METADATA_KEY = b"covered_ranges"
+_ADJUSTED_METADATA_KEY = b"adjusted_as_of"
+# Bars of these intervals span several days, a gap window could cut one and store a partial bar
+_MULTI_DAY_INTERVALS = {"5d", "1wk", "1mo", "3mo"}
+
+def _day_index(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """Local calendar day of every row, yfinance returns exchange-local tz-aware timestamps"""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize()
+
+def _merge_ranges(ranges: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    merged: list[tuple[date, date]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _missing_ranges(ranges: list[tuple[date, date]], start: date, end: date) -> list[tuple[date, date]]:
+    """Parts of [start, end) not covered by the (merged) ranges"""
+    gaps = []
+    cursor = start
+    for range_start, range_end in ranges:
+        if range_end <= cursor:
+            continue
+        if range_start >= end:
+            break
+        if range_start > cursor:
+            gaps.append((cursor, range_start))
+        cursor = max(cursor, range_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+def _weekend_only(start: date, end: date) -> bool:
+    return all((start + timedelta(days=i)).weekday() >= 5 for i in range((end - start).days))
+
+
+class HistoryStore:
+    """Local OHLCV store with one Parquet file per (symbol, interval), for intraday and daily intervals.
+
+    Each file records the half-open date ranges already fetched in its schema metadata, so a request only
+    downloads the days that are missing and merges them in. Only days before today are stored since
+    today's candles are still changing. Files are replaced atomically so data and ranges never disagree.
+
+    yfinance prices are adjusted for the splits and dividends known on the day they are fetched. The file
+    also records that day, and when a split or dividend happened since, every range it holds is fetched
+    again before new rows are merged in, so all the rows of a file always share one adjustment.
+
+    Weekly, monthly and other multi-day bars are not stored, they are fetched whole on every call.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, f"{symbol}_{interval}.parquet")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _read(self, path: str) -> tuple[Optional[pd.DataFrame], list[tuple[date, date]], Optional[date]]:
+        if not os.path.exists(path):
+            return None, [], None
+        table = pq.read_table(path)
+        metadata = table.schema.metadata
+        if _ADJUSTED_METADATA_KEY not in metadata:
+            # Written before the adjustment day was recorded, its rows may mix adjustments so it is fetched again
+            return None, [], None
+        ranges = json.loads(metadata[_RANGES_METADATA_KEY])
+        return (table.to_pandas(), [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in ranges],
+                date.fromisoformat(metadata[_ADJUSTED_METADATA_KEY].decode()))
+
+    def _write(self, path: str, frame: pd.DataFrame, ranges: list[tuple[date, date]], adjusted_as_of: date) -> None:
+        table = pa.Table.from_pandas(frame)
+        metadata = {**(table.schema.metadata or {}),
+                    _RANGES_METADATA_KEY: json.dumps([(start.isoformat(), end.isoformat()) for start, end in ranges]),
+                    _ADJUSTED_METADATA_KEY: adjusted_as_of.isoformat()}
+        table = table.replace_schema_metadata(metadata)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _fetch(symbol: str, interval: str, start: date, end: date) -> pd.DataFrame:
+        data: pd.DataFrame = yf.Ticker(symbol).history(start=start, end=end, interval=interval)
+        # Intraday intervals are indexed by "Datetime", keep a single name for the merged frame
+        data.index.name = "Date"
+        return data
+
+    @staticmethod
+    def _has_actions_since(symbol: str, since: date) -> bool:
+        """Whether the symbol had a split or paid a dividend on or after since"""
+        data: pd.DataFrame = yf.Ticker(symbol).history(start=since, end=date.today() + timedelta(days=1), interval="1d", actions=True)
+        actions = data[[column for column in ("Dividends", "Stock Splits") if column in data.columns]]
+        return bool((actions != 0).any(axis=None))
+
+    def get(self, symbol: str, interval: str, start: date, end: date) -> pd.DataFrame:
+        """Rows of [start, end), fetching only the days the store does not hold yet"""
+        if interval in _MULTI_DAY_INTERVALS:
+            return self._fetch(symbol, interval, start, end)
+        end = min(end, date.today())
+        path = self._path(symbol, interval)
+        with self._lock(path):
+            frame, ranges, adjusted_as_of = self._read(path)
+            gaps = _missing_ranges(ranges, start, end)
+            if gaps and frame is not None and self._has_actions_since(symbol, adjusted_as_of):
+                # The stored rows no longer match what a fetch returns today, replace all of them
+                gaps = _merge_ranges(ranges + [(start, end)])
+                frame, ranges = None, []
+            fetched_frames, fetched_ranges = [], []
+            for gap_start, gap_end in gaps:
+                data = self._fetch(symbol, interval, gap_start, gap_end)
+                # An empty weekday gap may be an upstream failure rather than a market holiday, fetch it again next time
+                if not data.empty or _weekend_only(gap_start, gap_end):
+                    fetched_ranges.append((gap_start, gap_end))
+                if not data.empty:
+                    fetched_frames.append(data)
+
+            if fetched_frames:
+                frame = pd.concat([frame, *fetched_frames]) if frame is not None else pd.concat(fetched_frames)
+                frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+            if fetched_ranges:
+                ranges = _merge_ranges(ranges + fetched_ranges)
+                if frame is not None:
+                    self._write(path, frame, ranges, date.today())
+
+        if frame is None:
+            return pd.DataFrame()
+        days = _day_index(frame.index)
+        return frame[(days >= pd.Timestamp(start)) & (days < pd.Timestamp(end))]
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import ORJSONResponse
-from .functions import query_cities, query_countries
-from .models import City, Country
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from .functions import query_cities, query_countries, nearest_cities
+
+EMPTY_RESPONSE = b"[]"
 
 router = APIRouter()
 
-@router.get("/cities", response_class=ORJSONResponse)
-def cities(
+@router.get("/cities")
+async def cities(
     city: str = "",
     country: str = "",
     flag: bool = False,
@@ -14,15 +16,32 @@ def cities(
     emoji: bool = False,
     limit: int = 100
 ):
-    items: list[City] = query_cities(city, country, flag, dial_code, emoji, limit)
-    if len(items) == 0:
+    response = await query_cities(city, country, flag, dial_code, emoji, limit)
+    if response == EMPTY_RESPONSE:
         raise HTTPException(status_code=204)
-    return ORJSONResponse(content=items, status_code=200)
-    
+    return Response(content=response, media_type="application/json", status_code=200)
+
+
+@router.get("/nearest")
+async def nearest(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = None,
+    flag: bool = False,
+    dial_code: bool = False,
+    emoji: bool = False,
+    limit: int = 10
+):
+    """Returns the cities closest to the coordinates, nearest first, optionally only those within radius_km"""
+    response = await nearest_cities(lat, lon, flag, dial_code, emoji, limit, radius_km)
+    if response == EMPTY_RESPONSE:
+        raise HTTPException(status_code=204)
+    return Response(content=response, media_type="application/json", status_code=200)
+
 
 @router.get("/countries")
-def countries(country: str = "", flag: bool = False, dial_code: bool = False, emoji: bool = False) -> ORJSONResponse:
-    items: list[Country] = query_countries(country, flag, dial_code, emoji)
-    if len(items) == 0:
+async def countries(country: str = "", flag: bool = False, dial_code: bool = False, emoji: bool = False):
+    response = await query_countries(country, flag, dial_code, emoji)
+    if response == EMPTY_RESPONSE:
         raise HTTPException(status_code=204)
-    return ORJSONResponse(content=items, status_code=200)
\ No newline at end of file
+    return Response(content=response, media_type="application/json", status_code=200)
\ No newline at end of file
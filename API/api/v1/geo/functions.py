@@ -1,8 +1,10 @@
+from typing import Optional
+import orjson
+from cachetools import LRUCache
 from fastapi import HTTPException
-from cachetools import cached
-from core.utils import cache, validate_input
-from core.db import cities_collection, countries_collection
-from .models import City, Country
+from core.config import GeoConfig
+from core.utils import validate_input, async_cached, fold_name
+from .index import geo_index, CITY_ROW, COUNTRY_ROW
 
 top11_cities = [
     {"city":"New York City","country":"United States"}, 
@@ -17,97 +19,78 @@ top11_cities = [
     {"city":"Osaka","country":"Japan"}
     ]
 
-@cached(cache)
-def query_cities(
+# Serialized responses, keyed by the index generation so a reload makes them unreachable
+city_responses = LRUCache(maxsize=GeoConfig.RESPONSE_CACHE_SIZE)
+country_responses = LRUCache(maxsize=GeoConfig.RESPONSE_CACHE_SIZE)
+
+def _columns(row: tuple[str, ...], base: tuple[str, ...], flag: bool, dial_code: bool, emoji: bool,
+             extra: tuple[str, ...] = ()) -> tuple[tuple[str, int], ...]:
+    """(key, position in the row) of every field included in the response items"""
+    keys = base + tuple(key for key, wanted in (("flag", flag), ("dial_code", dial_code), ("emoji", emoji)) if wanted) + extra
+    return tuple((key, row.index(key)) for key in keys)
+
+def _shape(rows: list[tuple], columns: tuple[tuple[str, int], ...]) -> list[dict]:
+    # Missing values are left out of the items
+    return [{key: row[position] for key, position in columns if row[position] is not None} for row in rows]
+
+async def query_cities(
     city: str = "",
     country: str = "",
     flag: bool = False,
     dial_code: bool = False,
     emoji: bool = False,
-    limit: int = 100) -> list[City]:
+    limit: int = 100) -> bytes:
+    """JSON list of {city, country} items, with the flag, dial_code and emoji of the country when asked"""
 
     if city and not validate_input(city):
         raise HTTPException(detail={"error":"Invalid city name"}, status_code=400)
     if country and not validate_input(country):
         raise HTTPException(detail={"error":"Invalid country name"}, status_code=400)
+    if limit < 1:
+        raise HTTPException(detail={"error":"limit must be at least 1"}, status_code=400)
 
-    query = {}
-
-    # Add city filter if specified
-    if city:
-        query["name"] = {"$regex": f'^{city}', "$options": 'i'}
-
-    # Add country filter if specified
-    if country:
-        query["country"] = {"$regex": f'^{country}', "$options": 'i'}
+    return await _query_cities(geo_index.generation, fold_name(city), fold_name(country), flag, dial_code, emoji, limit)
 
-    if not query:  # If no filters are specified, return the top results
-        top_cities_query = {"$or": [{"name": city_data["city"], "country": city_data["country"]} for city_data in top11_cities]}
-        top_cities_results = list(cities_collection.find(top_cities_query).sort([("name", 1)]))
-        results: list[dict] = top_cities_results
+@async_cached(city_responses)
+async def _query_cities(generation: int, city: str, country: str, flag: bool, dial_code: bool, emoji: bool, limit: int) -> bytes:
+    if not city and not country:  # If no filters are specified, return the top results
+        rows = sorted(await geo_index.get_cities([(city_data["city"], city_data["country"]) for city_data in top11_cities]),
+                      key=lambda row: row[0])
     else:
-        # Sort by population in descending order and then by name
-        results: list[dict] = list(cities_collection.find(query).sort([("population", -1), ("name", 1)]))
-
-    # Collect unique country names
-    country_names: set[dict] = set(result.get("country") for result in results if result.get("country"))
-
-    # Fetch country details for all unique country names in a single query
-    country_details_query = {"name": {"$in": list(country_names)}}
-    country_details_cursor: list[dict] = countries_collection.find(country_details_query)
-
-    # Create a dictionary for efficient lookup of country details based on country names
-    country_details_dict = {country.get("name"): country for country in country_details_cursor}
-
-    items = []
-    exact_match_items = []  # To store all items with an exact name match
-
-    for result in results:
-        city_name: str = result.get("name")
-        country_name: str = result.get("country") 
+        # Exact name matches first, then by population in descending order and then by name
+        rows = await geo_index.query_cities(city, country, limit)
 
-        # Get country details from the dictionary
-        country_details = country_details_dict.get(country_name, {})
+    return orjson.dumps(_shape(rows[:limit], _columns(CITY_ROW, ("city", "country"), flag, dial_code, emoji)))
 
-        item = dict(City(
-            city=city_name,
-            country=country_name,
-            flag=country_details.get("image") if flag else None,
-            dial_code=country_details.get("dial_code") if dial_code else None,
-            emoji=country_details.get("emoji") if emoji else None,
-        ))
-
-        if city_name.lower() == city.lower():
-            # If city_name is an exact match, add it to the list
-            exact_match_items.append(item)
-        else:
-            items.append(item)
-
-    # Add up to 'limit' exact match items at the beginning of the items array
-    items = exact_match_items + items
-
-    return items[:limit]
-
-@cached(cache)
-def query_countries(country: str = "", flag: bool = False, dial_code: bool = False, emoji: bool = False) -> list[Country]:
+async def nearest_cities(
+    lat: float,
+    lon: float,
+    flag: bool = False,
+    dial_code: bool = False,
+    emoji: bool = False,
+    limit: int = 10,
+    radius_km: Optional[float] = None) -> bytes:
+    """JSON list of {city, country, lat, lon, distance_km} items (plus the requested country details), nearest first"""
+
+    if not 1 <= limit <= GeoConfig.MAX_NEAREST_LIMIT:
+        raise HTTPException(detail={"error":f"limit must be between 1 and {GeoConfig.MAX_NEAREST_LIMIT}"}, status_code=400)
+    if radius_km is not None and radius_km <= 0:
+        raise HTTPException(detail={"error":"radius_km must be positive"}, status_code=400)
+
+    results: list[tuple[tuple, float]] = await geo_index.nearest_cities(lat, lon, limit, radius_km)
+    items = _shape([row for row, _ in results], _columns(CITY_ROW, ("city", "country"), flag, dial_code, emoji, ("lat", "lon")))
+    for item, (_, distance) in zip(items, results):
+        item["distance_km"] = round(distance, 3)
+    return orjson.dumps(items)
+
+async def query_countries(country: str = "", flag: bool = False, dial_code: bool = False, emoji: bool = False) -> bytes:
+    """JSON list of {country} items, with its flag, dial_code and emoji when asked"""
     if country and not validate_input(country):
         raise HTTPException(detail={"error":"Invalid country name"}, status_code=400)
-    
-    query = {"name": {"$regex": f'^{country}', "$options": 'i'}}
-
-    results: list[dict] = list(countries_collection.find(query).sort("name", 1))
-
-    items = []
-    for result in results:
-        country_name = result.get("name")
-
-        item = dict(Country(
-            country=country_name,
-            flag=result.get("image") if flag else None,
-            dial_code=result.get("dial_code") if dial_code else None,
-            emoji=result.get("emoji") if emoji else None
-        ))
 
-        items.append(item)
+    return await _query_countries(geo_index.generation, fold_name(country), flag, dial_code, emoji)
 
-    return items
\ No newline at end of file
+@async_cached(country_responses)
+async def _query_countries(generation: int, country: str, flag: bool, dial_code: bool, emoji: bool) -> bytes:
+    rows = await geo_index.query_countries(country)
+    return orjson.dumps(_shape(rows, _columns(COUNTRY_ROW, ("country",), flag, dial_code, emoji)))
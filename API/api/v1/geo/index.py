@@ -0,0 +1,277 @@
+import heapq
+import asyncio
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import Optional
+import numpy as np
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from core.config import GeoConfig
+from core.db import db
+from core.utils import fold_name
+from .spatial import SpatialGrid
+
+def _trigrams(key: str) -> list[str]:
+    """Trigram starting at every position of the key, padded at the start so the first characters count too"""
+    padded = "$$" + key
+    return [padded[i:i + 3] for i in range(len(key))]
+
+# Characters of every name kept for near match checks, longer queries only get prefix matches
+_FUZZY_PREFIX_WIDTH = 32
+
+def _max_edits(length: int) -> int:
+    """Typos tolerated for a query of this length: none up to 4 characters, 1 up to 8 and 2 above.
+    Every edit changes at most 4 of the query's trigrams (an adjacent transposition does), so this keeps
+    at least one trigram shared with every match and the trigram filter of _fuzzy_ranks lossless"""
+    return min((length - 1) // 4, 2, GeoConfig.FUZZY_MAX_EDITS)
+
+def _prefix_distances(query: str, codes: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Smallest edit distance (with adjacent transpositions) between query and any prefix of every name.
+
+    codes holds the first characters of each name, one row per name, and lengths how many of them are real.
+    Bit-parallel (Myers/Hyyrö) over the query characters, with every name in its own lane of one big integer
+    so each step is a handful of integer operations for all the names at once.
+    """
+    length = len(query)
+    dtype = np.uint16 if length < 16 else np.uint32
+    query_codes = np.array([ord(char) for char in query], dtype=np.uint32)
+    chars = np.unique(query_codes)
+    masks = np.zeros(len(chars), dtype=dtype)
+    for position, code in enumerate(query_codes):
+        masks[np.searchsorted(chars, code)] |= dtype(1 << position)
+    # Bitmask of the query positions holding each name character, one row per name column
+    found = np.minimum(np.searchsorted(chars, codes), len(chars) - 1)
+    peq = np.where(chars[found] == codes, masks[found], dtype(0)).T.copy()
+
+    lanes = codes.shape[0]
+    size = lanes * np.dtype(dtype).itemsize
+    def repeat(value: int) -> int:
+        return int.from_bytes(np.full(lanes, value, dtype=dtype).tobytes(), "little")
+    # Lanes have at least one spare bit above the query, carries and shifts out of a lane are masked away
+    full, ones, top = repeat((1 << length) - 1), repeat(1), repeat(1 << (length - 1))
+    vp, vn, d0, previous_eq = full, 0, 0, 0
+    gains, losses = [], []
+    for column in range(peq.shape[0]):
+        eq = int.from_bytes(peq[column].tobytes(), "little")
+        transposed = ((~d0 & eq) << 1) & previous_eq
+        x = eq | vn
+        d0 = ((((x & vp) + vp) ^ vp) | x | transposed) & full
+        hn = vp & d0
+        hp = (vn | ~(vp | d0)) & full
+        x = ((hp << 1) | ones) & full
+        vn = x & d0
+        vp = ((hn << 1) | ~(x | d0)) & full
+        previous_eq = eq
+        gains.append((hp & top).to_bytes(size, "little"))
+        losses.append((hn & top).to_bytes(size, "little"))
+
+    # Distance to every prefix is the query length plus the running sum of the last row's deltas
+    gains = np.frombuffer(b"".join(gains), dtype=dtype).reshape(-1, lanes) >> (length - 1)
+    losses = np.frombuffer(b"".join(losses), dtype=dtype).reshape(-1, lanes) >> (length - 1)
+    distances = length + np.cumsum(gains.astype(np.int32) - losses.astype(np.int32), axis=0)
+    distances[np.arange(peq.shape[0])[:, None] >= lengths[None, :]] = length
+    return np.minimum(distances.min(axis=0), length)
+
+# Fields of the rows returned by the index, in order
+CITY_ROW = ("city", "country", "flag", "dial_code", "emoji", "lat", "lon")
+COUNTRY_ROW = ("country", "flag", "dial_code", "emoji")
+
+def _prefix_range(keys: list[str], prefix: str) -> tuple[int, int]:
+    """Bounds of the keys starting with prefix in a sorted list"""
+    return bisect_left(keys, prefix), bisect_left(keys, prefix + "\U0010ffff")
+
+
+class _Snapshot:
+    """Immutable view of both collections, rebuilt from scratch on every refresh"""
+
+    def __init__(self, cities: list[dict], countries: list[dict]) -> None:
+        # Cities ranked the way results are returned, by population and then name
+        cities.sort(key=lambda city: (-(city.get("population") or 0), city.get("name") or ""))
+        self.cities = cities
+
+        # Sorted folded names with the rank of the city they belong to
+        city_keys = sorted((fold_name(city.get("name") or ""), rank) for rank, city in enumerate(cities))
+        self.city_keys = [key for key, _ in city_keys]
+        self.city_ranks = [rank for _, rank in city_keys]
+
+        # Distinct folded names with the ranks of their cities, and a (trigram, position) -> name ids index over
+        # their first characters for fuzzy lookups
+        self.names: list[str] = []
+        self.name_ranks: list[list[int]] = []
+        for key, rank in city_keys:
+            if self.names and self.names[-1] == key:
+                self.name_ranks[-1].append(rank)
+            else:
+                self.names.append(key)
+                self.name_ranks.append([rank])
+
+        # First characters of every name as code points, what near matches are checked against
+        width = _FUZZY_PREFIX_WIDTH
+        padded = "".join(name[:width].ljust(width, "\0") for name in self.names)
+        self.name_codes = np.frombuffer(padded.encode("utf-32-le"), dtype=np.uint32).reshape(-1, width)
+        self.name_lengths = np.array([min(len(name), width) for name in self.names], dtype=np.int16)
+        self.name_best_ranks = np.array([ranks[0] for ranks in self.name_ranks], dtype=np.int64)
+        postings: dict[tuple[str, int], list[int]] = {}
+        for name_id, name in enumerate(self.names):
+            for position, gram in enumerate(_trigrams(name[:width])):
+                postings.setdefault((gram, position), []).append(name_id)
+        self.trigrams = {key: np.array(ids, dtype=np.int32) for key, ids in postings.items()}
+
+        # Cities with coordinates in a spatial grid for nearest city lookups
+        located = [(rank, city[GeoConfig.CITY_LAT_FIELD], city[GeoConfig.CITY_LON_FIELD]) for rank, city in enumerate(cities)
+                   if city.get(GeoConfig.CITY_LAT_FIELD) is not None and city.get(GeoConfig.CITY_LON_FIELD) is not None]
+        self.located_ranks = np.array([rank for rank, _, _ in located], dtype=np.int64)
+        self.spatial_grid = SpatialGrid(np.array([lat for _, lat, _ in located], dtype=np.float64),
+                                        np.array([lon for _, _, lon in located], dtype=np.float64),
+                                        GeoConfig.NEAREST_CELL_KM) if located else None
+
+        # Ranks of every country's cities, already in result order
+        self.country_city_ranks: dict[str, list[int]] = {}
+        for rank, city in enumerate(cities):
+            self.country_city_ranks.setdefault(city.get("country"), []).append(rank)
+
+        self.city_by_name_country = {(city.get("name"), city.get("country")): rank for rank, city in enumerate(cities)}
+
+        countries.sort(key=lambda country: country.get("name") or "")
+        self.countries = countries
+        country_keys = sorted((fold_name(country.get("name") or ""), position) for position, country in enumerate(countries))
+        self.country_keys = [key for key, _ in country_keys]
+        self.country_positions = [position for _, position in country_keys]
+
+        # Response rows shaped once per refresh with the country details already joined, see CITY_ROW and COUNTRY_ROW
+        details = {country.get("name"): (country.get("image"), country.get("dial_code"), country.get("emoji")) for country in countries}
+        self.city_rows = [(city.get("name"), city.get("country"), *details.get(city.get("country"), (None, None, None)),
+                           city.get(GeoConfig.CITY_LAT_FIELD), city.get(GeoConfig.CITY_LON_FIELD)) for city in cities]
+        self.country_rows = [(country.get("name"), *details[country.get("name")]) for country in countries]
+
+
+class GeoIndex:
+    """In-process prefix index over the cities and countries collections.
+
+    Both datasets are loaded at startup and periodically reloaded, queries are answered with binary searches
+    over sorted folded names and never touch Mongo. City queries with few prefix matches are completed with
+    typo-tolerant matches, found through a trigram index and checked with a bounded prefix edit distance.
+    Cities with coordinates are also kept in a spatial grid for nearest city lookups.
+    """
+
+    CITY_FIELDS = {"_id": 0, "name": 1, "country": 1, "population": 1, GeoConfig.CITY_LAT_FIELD: 1, GeoConfig.CITY_LON_FIELD: 1}
+    COUNTRY_FIELDS = {"_id": 0, "name": 1, "image": 1, "dial_code": 1, "emoji": 1}
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[_Snapshot] = None
+        self._ready = asyncio.Event()
+        # Bumped on every reload, part of the key of anything cached from a snapshot
+        self.generation = 0
+
+    async def load(self) -> None:
+        cities = await db.cities_collection.find({}, self.CITY_FIELDS).to_list(None)
+        countries = await db.countries_collection.find({}, self.COUNTRY_FIELDS).to_list(None)
+        # Building the fuzzy index takes a while, keep serving the previous snapshot meanwhile
+        self._snapshot = await run_in_threadpool(_Snapshot, cities, countries)
+        self.generation += 1
+        self._ready.set()
+
+    async def refresh_periodically(self) -> None:
+        """Load the datasets and reload them every GeoConfig.INDEX_REFRESH_INTERVAL seconds"""
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"Failed to load the geo index: {e}")
+            await asyncio.sleep(GeoConfig.INDEX_REFRESH_INTERVAL if self._ready.is_set() else 5)
+
+    async def snapshot(self) -> _Snapshot:
+        """Current snapshot, waiting a bit for the first load, requests fail with a 503 while the index is not loaded"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), GeoConfig.INDEX_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(detail={"error":"Geo index is loading, try again later"}, status_code=503)
+        return self._snapshot
+
+    @staticmethod
+    def _matching_countries(snapshot: _Snapshot, prefix: str) -> list[int]:
+        lo, hi = _prefix_range(snapshot.country_keys, fold_name(prefix))
+        return sorted(snapshot.country_positions[lo:hi])
+
+    @staticmethod
+    def _fuzzy_ranks(snapshot: _Snapshot, query: str, country_names: Optional[set], limit: int, seen: set[int]) -> list[int]:
+        """Ranks of up to limit cities whose name starts with a near match of the query, closest first and then by population"""
+        max_edits = _max_edits(len(query))
+        if not max_edits or len(query) + max_edits > _FUZZY_PREFIX_WIDTH:
+            return []
+        grams = _trigrams(query)
+        # Every edit changes at most 4 trigrams (an adjacent transposition) and moves the others by one position,
+        # so names sharing fewer than this many trigrams within max_edits positions of the query's cannot be
+        # within max_edits
+        threshold = len(grams) - 4 * max_edits
+        postings = [snapshot.trigrams[gram, position + shift]
+                    for position, gram in enumerate(grams)
+                    for shift in range(-max_edits, max_edits + 1)
+                    if (gram, position + shift) in snapshot.trigrams]
+        if threshold < 1 or not postings:
+            return []
+
+        counts = np.bincount(np.concatenate(postings))
+        candidates = np.flatnonzero(counts >= threshold)
+        if not len(candidates):
+            return []
+        if len(candidates) > GeoConfig.FUZZY_MAX_CANDIDATES:
+            # Only the names sharing the most trigrams are checked exactly, the most populated ones on ties
+            priority = snapshot.name_best_ranks[candidates] - counts[candidates].astype(np.int64) * len(snapshot.cities)
+            candidates = candidates[np.argpartition(priority, GeoConfig.FUZZY_MAX_CANDIDATES)[:GeoConfig.FUZZY_MAX_CANDIDATES]]
+
+        width = len(query) + max_edits
+        distances = _prefix_distances(query, snapshot.name_codes[candidates, :width],
+                                      np.minimum(snapshot.name_lengths[candidates], width))
+        close = distances <= max_edits
+        matches = []
+        for name_id, distance in zip(candidates[close].tolist(), distances[close].tolist()):
+            for rank in snapshot.name_ranks[name_id]:
+                if rank not in seen and (country_names is None or snapshot.cities[rank].get("country") in country_names):
+                    matches.append((distance, rank))
+        return [rank for _, rank in heapq.nsmallest(limit, matches)]
+
+    async def query_cities(self, city: str, country: str, limit: int) -> list[tuple]:
+        """Up to limit matching city rows: exact name matches, then prefix matches by population
+        and then, when there are only a few of those, near matches by edit distance and population"""
+        snapshot = await self.snapshot()
+        country_names = ({snapshot.countries[position].get("name") for position in self._matching_countries(snapshot, country)}
+                         if country else None)
+
+        if not city:
+            ranks = heapq.merge(*(snapshot.country_city_ranks.get(name, []) for name in country_names))
+            return [snapshot.city_rows[rank] for rank in islice(ranks, limit)]
+
+        folded_city = fold_name(city)
+        lo, hi = _prefix_range(snapshot.city_keys, folded_city)
+        exact_hi = bisect_right(snapshot.city_keys, folded_city, lo, hi)
+        exact, others = snapshot.city_ranks[lo:exact_hi], snapshot.city_ranks[exact_hi:hi]
+        if country_names is not None:
+            exact = [rank for rank in exact if snapshot.cities[rank].get("country") in country_names]
+            others = [rank for rank in others if snapshot.cities[rank].get("country") in country_names]
+        ranks = sorted(exact) + heapq.nsmallest(limit, others)
+        if len(ranks) < min(limit, GeoConfig.FUZZY_MIN_RESULTS):
+            ranks += self._fuzzy_ranks(snapshot, folded_city, country_names, limit - len(ranks), set(ranks))
+        return [snapshot.city_rows[rank] for rank in ranks[:limit]]
+
+    async def nearest_cities(self, lat: float, lon: float, limit: int, radius_km: Optional[float] = None) -> list[tuple[tuple, float]]:
+        """Up to limit (city row, distance in km) pairs closest to the coordinates, nearest first"""
+        snapshot = await self.snapshot()
+        if snapshot.spatial_grid is None:
+            return []
+        positions, distances = snapshot.spatial_grid.query(lat, lon, limit, radius_km)
+        return [(snapshot.city_rows[rank], distance)
+                for rank, distance in zip(snapshot.located_ranks[positions].tolist(), distances.tolist())]
+
+    async def get_cities(self, cities: list[tuple[str, str]]) -> list[tuple]:
+        """City rows of the (name, country) pairs that exist"""
+        snapshot = await self.snapshot()
+        return [snapshot.city_rows[snapshot.city_by_name_country[key]] for key in cities if key in snapshot.city_by_name_country]
+
+    async def query_countries(self, country: str) -> list[tuple]:
+        snapshot = await self.snapshot()
+        if not country:
+            return snapshot.country_rows
+        return [snapshot.country_rows[position] for position in self._matching_countries(snapshot, country)]
+
+geo_index = GeoIndex()
@@ -0,0 +1,92 @@
+import math
+from typing import Optional
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Above this many grid rows per lookup a linear scan of every point is cheaper
+_MAX_GRID_ROWS = 4096
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def _km_to_chord(km: float) -> float:
+    """Straight-line distance between two points of the unit sphere that are km apart on the surface"""
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+def _chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1))
+
+
+class SpatialGrid:
+    """Uniform 3D grid over points on the unit sphere, answering k nearest and radius queries.
+
+    Points are sorted by cell so every (x, y) row of cells is a contiguous slice found with a binary search.
+    A lookup gathers the cells around the query and widens the block until it provably holds the answer:
+    every point closer than the block's half width is inside it.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_km: float) -> None:
+        self.cell = _km_to_chord(cell_km)
+        self.cells_per_axis = int(2 / self.cell) + 1
+        vectors = _unit_vectors(lat, lon)
+        cell_ids = self._cell_ids(self._cells(vectors))
+        order = np.argsort(cell_ids, kind="stable")
+        self.cell_ids = cell_ids[order]
+        self.points = vectors[order]
+        # Position of every sorted point in the arrays the grid was built from
+        self.positions = order
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cells(self, vectors: np.ndarray) -> np.ndarray:
+        return np.minimum(((vectors + 1) / self.cell).astype(np.int64), self.cells_per_axis - 1)
+
+    def _cell_ids(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[..., 0] * self.cells_per_axis + cells[..., 1]) * self.cells_per_axis + cells[..., 2]
+
+    def _gather(self, center: np.ndarray, reach: int) -> np.ndarray:
+        """Indexes of the points in the cells at most reach cells away from center on every axis"""
+        n = self.cells_per_axis
+        x, y, z = center.tolist()
+        xs = np.arange(max(x - reach, 0), min(x + reach, n - 1) + 1)
+        ys = np.arange(max(y - reach, 0), min(y + reach, n - 1) + 1)
+        rows = (xs[:, None] * n + ys[None, :]).ravel() * n
+        lo = np.searchsorted(self.cell_ids, rows + max(z - reach, 0))
+        hi = np.searchsorted(self.cell_ids, rows + min(z + reach, n - 1), side="right")
+        lengths = hi - lo
+        # Concatenation of every [lo, hi) range without a Python loop
+        starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+        return starts + np.arange(lengths.sum())
+
+    def query(self, lat: float, lon: float, k: int, radius_km: Optional[float] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Positions and distances in km of the (up to) k points closest to (lat, lon), nearest first,
+        only counting the points within radius_km when it is given"""
+        target = _unit_vectors(np.array([lat]), np.array([lon]))[0]
+        center = self._cells(target)
+        max_chord = _km_to_chord(radius_km) if radius_km is not None else math.inf
+
+        # The k nearest within the radius are the k nearest filtered by it, so widen until either is settled
+        reach = 1
+        while True:
+            if (2 * reach + 1) ** 2 > _MAX_GRID_ROWS or reach >= self.cells_per_axis:
+                candidates, covered = np.arange(len(self.points)), math.inf
+                points = self.points
+            else:
+                candidates, covered = self._gather(center, reach), reach * self.cell
+                points = self.points[candidates]
+            chords = np.sqrt(np.maximum(2 - 2 * (points @ target), 0))
+            if covered >= max_chord or np.count_nonzero(chords < covered) >= k:
+                break
+            reach *= 2
+
+        within = chords <= max_chord
+        candidates, chords = candidates[within], chords[within]
+        if len(chords) > k:
+            nearest = np.argpartition(chords, k)[:k]
+            candidates, chords = candidates[nearest], chords[nearest]
+        order = np.argsort(chords, kind="stable")
+        return self.positions[candidates[order]], _chord_to_km(chords[order])
@@ -1,53 +1,50 @@
-import requests
-from fastapi.responses import ORJSONResponse
+from typing import Optional
+from fastapi.responses import Response
 from fastapi import APIRouter, HTTPException
 from core.config import APIConfig
+from core.http_client import http_client
+from core.item_pool import ItemPool
 
 router = APIRouter()
 
-@router.get("/dad-joke")
-def dad_joke() -> ORJSONResponse:
-    headers = {"Accept": "application/json"} 
-    response = requests.get(APIConfig.DAD_JOKES_API, headers=headers) 
-
+async def _get_json(url: str) -> Optional[dict]:
+    response = await http_client.get(url, headers={"Accept": "application/json"})
     if response.status_code == 200:
-        joke_data = response.json()
-        return ORJSONResponse(content={"joke":joke_data["joke"]}, status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail={"error":"could not fetch a random dad joke"})
+        return response.json()
+    return None
+
+def _pool(name: str, url: str, shape=lambda data: data) -> ItemPool:
+    # Every refill call has to reach the upstream to get a different random item, no single-flight here
+    return ItemPool(name, lambda: _get_json(url), shape)
+
+dad_jokes = _pool("dad-joke", APIConfig.DAD_JOKES_API, lambda data: {"joke": data["joke"]})
+yo_momma_jokes = _pool("yo-momma-joke", APIConfig.YO_MOMMA_API)
+chuck_norris_jokes = _pool("chuck-norris-joke", APIConfig.CHUCK_NORRIS_API, lambda data: {"joke": data["value"]})
+facts = _pool("random-fact", APIConfig.FACTS_API, lambda data: {"fact": data["text"]})
+riddles = _pool("random-riddle", APIConfig.RIDDLES_API)
+
+async def _pooled_response(pool: ItemPool, error: str) -> Response:
+    item = await pool.get()
+    if item is None:
+        raise HTTPException(status_code=500, detail={"error": error})
+    return Response(content=item, media_type="application/json", status_code=200)
+
+@router.get("/dad-joke")
+async def dad_joke() -> Response:
+    return await _pooled_response(dad_jokes, "could not fetch a random dad joke")
 
 @router.get("/yo-momma-joke")
-def yo_momma_joke() -> ORJSONResponse:
-    response = requests.get(APIConfig.YO_MOMMA_API)
-    if(response.status_code == 200):
-        joke_data = response.json()
-        return ORJSONResponse(content=joke_data, status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail={"error":"could not fetch a random yo momma joke"})
-    
+async def yo_momma_joke() -> Response:
+    return await _pooled_response(yo_momma_jokes, "could not fetch a random yo momma joke")
+
 @router.get("/chuck-norris-joke")
-def chuck_norris_joke() -> ORJSONResponse:
-    response = requests.get(APIConfig.CHUCK_NORRIS_API)
-    if(response.status_code == 200):
-        joke_data = response.json()
-        return ORJSONResponse(content={"joke":joke_data["value"]}, status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail={"error":"could not fetch a random chuck norris joke"})
+async def chuck_norris_joke() -> Response:
+    return await _pooled_response(chuck_norris_jokes, "could not fetch a random chuck norris joke")
 
 @router.get("/random-fact")
-def random_fact() -> ORJSONResponse:
-    response = requests.get(APIConfig.FACTS_API)
-    if(response.status_code == 200):
-        data = response.json()
-        return ORJSONResponse(content={"fact": data["text"]}, status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail={"error":"could not fetch a random fact"})
-    
+async def random_fact() -> Response:
+    return await _pooled_response(facts, "could not fetch a random fact")
+
 @router.get("/random-riddle")
-def random_riddle() -> ORJSONResponse:
-    response = requests.get(APIConfig.RIDDLES_API)
-    if(response.status_code == 200):
-        data = response.json()
-        return ORJSONResponse(content=data, status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail={"error":"could not fetch a random riddle"})
\ No newline at end of file
+async def random_riddle() -> Response:
+    return await _pooled_response(riddles, "could not fetch a random riddle")
@@ -1,14 +1,29 @@
-import segno
+import io
 import base64
-import tempfile
-from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import ORJSONResponse
+import zipfile
+import asyncio
+import threading
+from enum import Enum
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Iterator
+import orjson
+import segno
+from cachetools import LRUCache
+from pydantic import BaseModel, ConfigDict, Field
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import Response, StreamingResponse
+from core.config import QRConfig
+from core.executors import executors
 from core.rate_limiter import rate_limiter
+from core.utils import async_cached
 
 router = APIRouter()
 
 class QrParams(BaseModel):
+    # Frozen so the parameters can be the render cache key
+    model_config = ConfigDict(frozen=True)
+
     data: str
     back_color: str = "white"
     front_color: str = "black"
@@ -16,20 +31,121 @@ class QrParams(BaseModel):
     border_size: int = 1
     border_color: str = "white"
 
+class QrFormat(str, Enum):
+    DATA_URL = "data-url"  # JSON with a base64 PNG data URL
+    PNG = "png"
+    SVG = "svg"
+
+MEDIA_TYPES = {QrFormat.DATA_URL: "application/json", QrFormat.PNG: "image/png", QrFormat.SVG: "image/svg+xml"}
+
+class QrBatchRequest(BaseModel):
+    items: list[QrParams] = Field(..., min_length=1, max_length=QRConfig.MAX_BATCH_SIZE)
+    format: QrFormat = QrFormat.PNG
+    compress_level: int = Field(9, ge=0, le=9)
+
+# Rendered responses, bounded by their total size
+qr_cache = LRUCache(maxsize=QRConfig.CACHE_MAX_BYTES, getsizeof=len)
+
+# One output buffer per worker, reused by every render of that worker
+_buffers = threading.local()
+
+def _save(qr_params: QrParams, kind: str, **options) -> bytes:
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    segno.make_qr(qr_params.data).save(buffer, kind=kind, scale=qr_params.scale, border=qr_params.border_size,
+                                       light=qr_params.back_color, dark=qr_params.front_color, quiet_zone=qr_params.border_color,
+                                       **options)
+    return buffer.getvalue()
+
+def _render(qr_params: QrParams, format: QrFormat, compress_level: int) -> bytes:
+    """Response body of the QR code in the format, compress_level (0-9) is the PNG zlib level"""
+    if format == QrFormat.SVG:
+        return _save(qr_params, "svg")
+    png = _save(qr_params, "png", compresslevel=compress_level)
+    if format == QrFormat.PNG:
+        return png
+    return orjson.dumps({"QR_URL": f"data:image/png;base64,{base64.b64encode(png).decode()}"})
+
+def _render_chunk(items: list[QrParams], format: QrFormat, compress_level: int) -> list[bytes]:
+    return [_render(qr_params, format, compress_level) for qr_params in items]
+
+@async_cached(qr_cache)
+async def render_qr(qr_params: QrParams, format: QrFormat = QrFormat.DATA_URL, compress_level: int = 9) -> bytes:
+    # segno is pure Python, rendering in a worker process keeps it from holding this worker's GIL
+    return await executors.run_process("qr", _render, qr_params, format, compress_level)
+
+class _ZipOutput(io.RawIOBase):
+    """Write-only stream collecting what zipfile writes until the next read of the chunk"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+def _zip_entries(zip_file: zipfile.ZipFile, output: _ZipOutput, names: Iterator[str], images: list[bytes], format: QrFormat) -> bytes:
+    for image in images:
+        # PNGs are already deflated, SVG text compresses well
+        zip_file.writestr(next(names), image, compress_type=zipfile.ZIP_DEFLATED if format == QrFormat.SVG else zipfile.ZIP_STORED)
+    return output.take()
+
+def _render_chunks(batch: QrBatchRequest, start: int) -> Iterator[asyncio.Task]:
+    for position in range(start, len(batch.items), QRConfig.BATCH_CHUNK_SIZE):
+        chunk = batch.items[position:position + QRConfig.BATCH_CHUNK_SIZE]
+        yield asyncio.create_task(executors.run_process("qr", _render_chunk, chunk, batch.format, batch.compress_level))
+
+async def _stream_zip(batch: QrBatchRequest, first_images: list[bytes]) -> AsyncIterator[bytes]:
+    """ZIP of every QR code, chunks are rendered by the worker processes in parallel while the archive is streamed"""
+    extension = "svg" if batch.format == QrFormat.SVG else ("json" if batch.format == QrFormat.DATA_URL else "png")
+    width = len(str(len(batch.items)))
+    names = (f"qr_{index:0{width}d}.{extension}" for index in range(1, len(batch.items) + 1))
+    chunks = _render_chunks(batch, len(first_images))
+    # Chunks rendering ahead of the one being written, as many as the qr tasks allowed to run at once
+    pending: deque[asyncio.Task] = deque(islice(chunks, executors.limit("qr")))
+    output = _ZipOutput()
+    try:
+        with zipfile.ZipFile(output, mode="w") as zip_file:
+            yield _zip_entries(zip_file, output, names, first_images, batch.format)
+            while pending:
+                images = await pending.popleft()
+                pending.extend(islice(chunks, 1))
+                yield _zip_entries(zip_file, output, names, images, batch.format)
+        yield output.take()
+    finally:
+        # The client went away or a render failed, the chunks still queued are not needed anymore
+        for task in pending:
+            task.cancel()
+
 @router.post("/generate")
 @rate_limiter(max_requests_per_second=1, max_requests_per_day=2)
-async def generate_qr_code(request: Request, qr_params: QrParams) -> ORJSONResponse:
+async def generate_qr_code(request: Request, qr_params: QrParams, format: QrFormat = QrFormat.DATA_URL,
+                           compress_level: int = Query(9, ge=0, le=9)) -> Response:
+    """Returns the QR code as JSON with a base64 data URL (default), or as a raw PNG or SVG image"""
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            # Create a QR code and save it to the temporary file
-            qr_code = segno.make_qr(qr_params.data)
-            qr_code.save(temp_file.name, scale=qr_params.scale, border=qr_params.border_size, light=qr_params.back_color, dark=qr_params.front_color, quiet_zone=qr_params.border_color)
-
-        # Read the content of the temporary file
-        with open(temp_file.name, "rb") as file:
-            img_base64 = base64.b64encode(file.read()).decode()
+        content = await render_qr(qr_params, format, compress_level)
+        return Response(status_code=200, content=content, media_type=MEDIA_TYPES[format])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return ORJSONResponse(status_code=200, content={"QR_URL": f"data:image/png;base64,{img_base64}"})
+@router.post("/batch")
+@rate_limiter(max_requests_per_second=1, max_requests_per_day=2)
+async def generate_qr_batch(request: Request, batch: QrBatchRequest) -> StreamingResponse:
+    """Returns a ZIP with one QR code per item, in order and named by position zero-padded to the batch size (qr_01.png... qr_10.png for 10 items), streamed as they are rendered"""
+    try:
+        # The first chunk is rendered before answering so invalid parameters still get an error status
+        first_images = await executors.run_process("qr", _render_chunk, batch.items[:QRConfig.BATCH_CHUNK_SIZE], batch.format, batch.compress_level)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(_stream_zip(batch, first_images), media_type="application/zip",
+                             headers={"Content-Disposition": 'attachment; filename="qr_codes.zip"'})
@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
@@ -5,6 +6,7 @@ from vonage import Client, Sms
 from core.config import SMSConfig
 from core.utils import get_api_key
 from core.rate_limiter import rate_limiter
+from core.jobs import JobQueue
 
 router = APIRouter()
 
@@ -13,11 +15,17 @@ class SmsRequest(BaseModel):
     to: list[str] = Field(..., max_length=5)
     text: str
 
-def send_sms(phone_num: str, msg: str, from_user: str) -> None:
-    client: Client = Client(key=SMSConfig.SMS_KEY, secret=SMSConfig.SMS_SECRET)
-    sms: Sms = Sms(client)
+_sms: Optional[Sms] = None
+
+def sms_client() -> Sms:
+    """One vonage client per process, its HTTP session is reused by every message"""
+    global _sms
+    if _sms is None:
+        _sms = Sms(Client(key=SMSConfig.SMS_KEY, secret=SMSConfig.SMS_SECRET))
+    return _sms
 
-    response_data = sms.send_message(
+def send_sms(phone_num: str, msg: str, from_user: str) -> None:
+    response_data = sms_client().send_message(
         {
             "from": from_user,
             "to": phone_num,
@@ -26,17 +34,31 @@ def send_sms(phone_num: str, msg: str, from_user: str) -> None:
         }
     )
 
-    if response_data["messages"][0]["status"] == "0":
-        print("Message sent successfully.")
-    else:
-        print(f"Message failed with error: {response_data['messages'][0]['error-text']}")
+    if response_data["messages"][0]["status"] != "0":
+        raise RuntimeError(f"Message failed with error: {response_data['messages'][0]['error-text']}")
+
+def deliver_sms(payload: dict) -> None:
+    """Job handler, numbers are dropped from the payload once served so a retry only sends to the rest"""
+    while payload["to"]:
+        send_sms(payload["to"][0], payload["text"], payload["from_user"])
+        payload["to"].pop(0)
+
+sms_queue = JobQueue("sms", deliver_sms)
 
 @router.post("/send")
 @rate_limiter(max_requests_per_second=1, max_requests_per_day=10)
 async def send_sms_endpoint(request: Request, sms_request: SmsRequest, user=Depends(get_api_key)):
+    """Queues an SMS, it is sent in the background, poll /sms/status/{job_id} for the outcome"""
     try:
-        for phone_num in sms_request.to:
-            send_sms(phone_num, sms_request.text, sms_request.from_user)
-        return ORJSONResponse(content={"message": "SMS sent successfully"}, status_code=200)
+        job_id = await sms_queue.enqueue({"from_user": sms_request.from_user, "to": sms_request.to, "text": sms_request.text},
+                                         owner=user["_id"])
+        return ORJSONResponse(content={"message": "SMS queued", "job_id": job_id}, status_code=202)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send SMS: {str(e)}")
+
+@router.get("/status/{job_id}")
+async def sms_status_endpoint(job_id: str, user=Depends(get_api_key)):
+    status = await sms_queue.status(job_id, owner=user["_id"])
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ORJSONResponse(content=status, status_code=200)
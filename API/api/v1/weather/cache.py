@@ -0,0 +1,44 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple
+from cachetools import LRUCache
+
+class _Entry(NamedTuple):
+    value: Any
+    fetched_at: float
+
+class StaleWhileRevalidateCache:
+    """Serves fresh entries directly, stale entries immediately while refreshing them in the background,
+    and only waits for the upstream when an entry is missing or too old to serve."""
+
+    def __init__(self, maxsize: int, fresh_ttl: float, stale_ttl: float) -> None:
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+        self._refreshing: dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry: _Entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.fresh_ttl:
+                return entry.value
+            if age < self.stale_ttl:
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+                return entry.value
+        return await self._fetch(key, fetch)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        if value is not None:
+            self._entries[key] = _Entry(value, time.monotonic())
+        return value
+
+    async def _refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await self._fetch(key, fetch)
+        except Exception:
+            pass  # keep serving the stale entry until it expires
+        finally:
+            self._refreshing.pop(key, None)
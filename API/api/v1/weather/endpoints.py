@@ -1,15 +1,37 @@
-from fastapi import APIRouter
-from fastapi.responses import ORJSONResponse
-from .functions import get_general_weather, get_current_temp
+from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+from core.config import WeatherConfig
+from .functions import get_general_weather, get_current_temp, get_bulk_weather
 
 router = APIRouter()
 
+class Coordinates(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+class BulkWeatherRequest(BaseModel):
+    cities: list[str] = Field([], max_length=WeatherConfig.MAX_BULK_LOCATIONS)
+    coordinates: list[Coordinates] = Field([], max_length=WeatherConfig.MAX_BULK_LOCATIONS)
+    lang: str = "en"
+
 @router.get("/general")
-def general_weather(city: str, lang: str = "en"):
-    response = get_general_weather(city, lang)
-    return ORJSONResponse(content=response, status_code=200)
+async def general_weather(city: str, lang: str = "en"):
+    response = await get_general_weather(city, lang)
+    return Response(content=response, media_type="application/json", status_code=200)
 
 @router.get("/current-temperature")
-def current_temperature(city: str, unit: str = "celsius"):
-    response = get_current_temp(city, unit)
-    return ORJSONResponse(content=response, status_code=200)
\ No newline at end of file
+async def current_temperature(city: str, unit: str = "celsius"):
+    response = await get_current_temp(city, unit)
+    return Response(content=response, media_type="application/json", status_code=200)
+
+@router.post("/bulk")
+async def bulk_weather(bulk_request: BulkWeatherRequest):
+    """Returns the general weather of many cities and/or coordinates at once"""
+    if not bulk_request.cities and not bulk_request.coordinates:
+        raise HTTPException(status_code=400, detail={"error": "No cities or coordinates provided"})
+    if len(bulk_request.cities) + len(bulk_request.coordinates) > WeatherConfig.MAX_BULK_LOCATIONS:
+        raise HTTPException(status_code=400, detail={"error": f"Cannot request more than {WeatherConfig.MAX_BULK_LOCATIONS} locations at a time"})
+    coordinates = [(coord.lat, coord.lon) for coord in bulk_request.coordinates]
+    response = await get_bulk_weather(bulk_request.cities, coordinates, bulk_request.lang)
+    return Response(content=response, media_type="application/json", status_code=200)
\ No newline at end of file
@@ -1,13 +1,20 @@
+import asyncio
 from datetime import datetime, timezone
-import requests
+import orjson
 from fastapi import HTTPException
-from core.config import WeatherConfig
-from typing import Optional
+from core.config import WeatherConfig, SingleFlightConfig
+from core.http_client import http_client
+from core.singleflight import SingleFlight
+from core.utils import fold_name
+from .cache import StaleWhileRevalidateCache
+from typing import Awaitable, Callable, Optional
 
 # ---------------------------------------------------------------- Reuseable functions ----------------------------------------------------------------
 
+TEMPERATURE_UNITS = ("celsius", "fahrenheit", "kelvin")
+
 def convert_temp(value: float, unit: str) -> float:
-    if not isinstance(value, (int, float)) or unit not in ["celsius", "fahrenheit", "kelvin"]:
+    if not isinstance(value, (int, float)) or unit not in TEMPERATURE_UNITS:
         return "N/A"
     elif unit == "celsius":
         result = value - 273.15
@@ -41,18 +48,44 @@ def convert_to_date(value: int, shift: int) -> str:
     dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
     return dt.strftime("%Y-%m-%d %H:%M:%S")
 
-def get_weather_data(city: str, lang: Optional[str] = "en") -> requests.Response:
-    response: requests.Response = requests.get(url=WeatherConfig.WEATHER_API_URL, params={"q": city, "lang": lang})
+_weather_flight = SingleFlight("weather", redis_lease=SingleFlightConfig.REDIS_LEASE)
+weather_cache = StaleWhileRevalidateCache(
+    maxsize=WeatherConfig.CACHE_SIZE,
+    fresh_ttl=WeatherConfig.FRESH_TTL,
+    stale_ttl=WeatherConfig.STALE_TTL)
+
+async def _fetch_weather_data(location: str, params: dict) -> dict:
+    response = await http_client.get(WeatherConfig.WEATHER_API_URL, params=params)
     if response.status_code == 404:
-        raise HTTPException(detail={"error": f"{city} was not found"}, status_code=404)
+        raise HTTPException(detail={"error": f"{location} was not found"}, status_code=404)
     if response.status_code == 200:
         return response.json()
-    
+
+async def _fetch_weather_report(key: tuple[str, str], location: str, params: dict) -> Optional["WeatherReport"]:
+    payload = await _weather_flight.do(key, lambda: _fetch_weather_data(location, params))
+    return WeatherReport(payload) if payload is not None else None
+
+async def get_weather_report(city: str, lang: Optional[str] = "en") -> Optional["WeatherReport"]:
+    """Cached report for the city, shared by every endpoint and every spelling of the same city"""
+    key = (fold_name(city), lang)
+    city = " ".join(city.split())
+    return await weather_cache.get(key, lambda: _fetch_weather_report(key, city, {"q": city, "lang": lang}))
+
+async def get_weather_report_by_coords(lat: float, lon: float, lang: Optional[str] = "en") -> Optional["WeatherReport"]:
+    """Cached report for the coordinates, rounded to ~1km so nearby points share an entry"""
+    lat, lon = round(lat, 2), round(lon, 2)
+    key = (f"{lat},{lon}", lang)
+    return await weather_cache.get(key, lambda: _fetch_weather_report(key, key[0], {"lat": lat, "lon": lon, "lang": lang}))
+
+async def get_weather_data(city: str, lang: Optional[str] = "en") -> dict:
+    """Raw weather payload"""
+    report = await get_weather_report(city, lang)
+    return report.payload if report is not None else None
+
 
 # ---------------------------------------------------------------- Functions for the API ------------------------------------------------------------
 
-def get_general_weather(city: str, lang: str) -> dict:
-    res_json = get_weather_data(city, lang)
+def build_general_weather(res_json: dict) -> dict:
     weather = {
         "city": res_json["name"],
         "coord":{
@@ -92,10 +125,64 @@ def get_general_weather(city: str, lang: str) -> dict:
     }
     return weather
 
-def get_current_temp(city: str, unit: str) -> dict[str, float]:
-    response = requests.get(f"{WeatherConfig.WEATHER_API_URL}&q={city}")
-    if response.status_code == 404:
-        raise HTTPException(detail={"error": f"{city} was not found"}, status_code=404)
-    if response.status_code == 200:
-        res_json = response.json()
-        return {"current temperature":convert_temp(res_json["main"]["temp"], unit)}
\ No newline at end of file
+class WeatherReport:
+    """A fetched payload and the serialized responses derived from it, each built once per payload"""
+    __slots__ = ("payload", "_general_json", "_current_temp_json")
+
+    def __init__(self, payload: dict) -> None:
+        self.payload = payload
+        self._general_json: Optional[bytes] = None
+        self._current_temp_json: dict[str, bytes] = {}
+
+    @property
+    def general_json(self) -> bytes:
+        if self._general_json is None:
+            self._general_json = orjson.dumps(build_general_weather(self.payload))
+        return self._general_json
+
+    def current_temp_json(self, unit: str) -> bytes:
+        content = self._current_temp_json.get(unit)
+        if content is None:
+            content = orjson.dumps({"current temperature":convert_temp(self.payload["main"]["temp"], unit)})
+            if unit in TEMPERATURE_UNITS:
+                self._current_temp_json[unit] = content
+        return content
+
+async def get_general_weather(city: str, lang: str) -> bytes:
+    report = await get_weather_report(city, lang)
+    return report.general_json
+
+async def get_bulk_weather(cities: list[str], coordinates: list[tuple[float, float]], lang: str) -> bytes:
+    """General weather of many locations fetched concurrently (at most WeatherConfig.BULK_CONCURRENCY upstream
+    calls at a time), locations that failed are reported under errors instead of failing the whole request"""
+    semaphore = asyncio.Semaphore(WeatherConfig.BULK_CONCURRENCY)
+    results: dict[str, bytes] = {}
+    errors: dict[str, str] = {}
+
+    async def fetch(location: str, get_report: Callable[[], Awaitable[Optional[WeatherReport]]]) -> None:
+        async with semaphore:
+            try:
+                report = await get_report()
+            except HTTPException as e:
+                errors[location] = e.detail["error"] if isinstance(e.detail, dict) else str(e.detail)
+                return
+            except Exception:
+                errors[location] = f"could not fetch the weather of {location}"
+                return
+        if report is None:
+            errors[location] = f"could not fetch the weather of {location}"
+        else:
+            results[location] = report.general_json
+
+    await asyncio.gather(
+        *(fetch(city, lambda city=city: get_weather_report(city, lang)) for city in dict.fromkeys(cities)),
+        *(fetch(f"{lat},{lon}", lambda lat=lat, lon=lon: get_weather_report_by_coords(lat, lon, lang))
+          for lat, lon in dict.fromkeys(coordinates)))
+
+    # Reuse the cached serialized reports instead of serializing them again
+    results_json = b",".join(orjson.dumps(location) + b":" + content for location, content in results.items())
+    return b'{"results":{' + results_json + b'},"errors":' + orjson.dumps(errors) + b"}"
+
+async def get_current_temp(city: str, unit: str) -> bytes:
+    report = await get_weather_report(city)
+    return report.current_temp_json(unit)
\ No newline at end of file
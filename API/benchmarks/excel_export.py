@@ -0,0 +1,91 @@
+"""Excel exports: _write_excel (openpyxl write-only mode, to a file) against pandas' ExcelWriter into memory.
+
+Every run happens in a fresh process so the peak RSS of one does not hide the other's. The peak is
+reported above the RSS once the frame is built, i.e. what writing the workbook itself costs. A small
+export is read back from both first to check that the cells are the same.
+
+    cd API && python -m benchmarks.excel_export [rows]
+"""
+import io
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+import numpy as np
+import openpyxl
+import pandas as pd
+from api.v1.finance.functions import _write_excel
+
+
+def frame(rows: int) -> pd.DataFrame:
+    """A stock history the way the export gets it, 8 columns"""
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    return pd.DataFrame({
+        "Date": pd.date_range("2000-01-01", periods=rows, freq="min"),
+        "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": rng.integers(1000, 10 ** 6, rows),
+        "Interval Change (%)": rng.normal(0, 1, rows), "Total Change (%)": rng.normal(0, 10, rows),
+    })
+
+
+def old_excel(data: pd.DataFrame) -> bytes:
+    """How exports were written before"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        data.to_excel(writer, index=False, sheet_name='Sheet1')
+    return output.getvalue()
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, rows: int) -> None:
+    data = frame(rows)
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if mode == "old":
+        size = len(old_excel(data))
+    else:
+        path = _write_excel({"Sheet1": data})
+        size = os.path.getsize(path)
+        os.remove(path)
+    seconds = time.perf_counter() - started
+    print(json.dumps({"rows_per_second": rows / seconds, "peak_rss_mb": _peak_rss_mb() - baseline, "size_mb": size / 2 ** 20}))
+
+
+def _cells(source) -> list[tuple]:
+    workbook = openpyxl.load_workbook(source, read_only=True)
+    return list(workbook.worksheets[0].iter_rows(values_only=True))
+
+
+def same_cells(rows: int) -> bool:
+    data = frame(rows)
+    path = _write_excel({"Sheet1": data})
+    try:
+        return _cells(path) == _cells(io.BytesIO(old_excel(data)))
+    finally:
+        os.remove(path)
+
+
+def main() -> None:
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2], int(sys.argv[3]))
+        return
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 120_000
+    same = same_cells(2000)
+    print(f"same cells as the old export: {same}")
+    for mode in ("old", "new"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.excel_export", "--child", mode, str(rows)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print(f"{mode}: {rows} rows, {result['rows_per_second']:7.0f} rows/s, "
+              f"+{result['peak_rss_mb']:.0f} MB peak RSS, {result['size_mb']:.1f} MB file")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Typo-tolerant city search: correctness against a brute force scan and query latency.
+
+Builds a synthetic geo index (no Mongo needed) and checks that every name within the allowed edit distance
+of a query, transpositions included, comes back from the trigram prefilter, then times typo queries.
+
+    cd API && python -m benchmarks.geo_fuzzy [cities]
+"""
+import sys
+import time
+import random
+import string
+from api.v1.geo.index import GeoIndex, _Snapshot, _max_edits, _prefix_distances, _FUZZY_PREFIX_WIDTH
+from core.config import GeoConfig
+from core.utils import fold_name
+
+KNOWN = ["Zürich", "London", "Londonderry", "Tel Aviv", "São Paulo", "Jerusalem", "Haifa", "Amsterdam", "Rotterdam", "Berlin"]
+# (query, city it must find) for typos the trigram filter used to drop, adjacent transpositions change 4 trigrams
+TYPOS = [("zuirch", "Zürich"), ("uzrich", "Zürich"), ("lodnon", "London"), ("olndon", "London"), ("jerusaelm", "Jerusalem"),
+         ("amstedram", "Amsterdam"), ("tel avvi", "Tel Aviv")]
+
+
+def _random_name(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))).capitalize()
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    position = rng.randrange(len(word) - 1)
+    edit = rng.choice(("substitute", "insert", "delete", "transpose"))
+    if edit == "substitute":
+        return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+    if edit == "insert":
+        return word[:position] + rng.choice(string.ascii_lowercase) + word[position:]
+    if edit == "delete":
+        return word[:position] + word[position + 1:]
+    return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+
+
+def build(count: int, rng: random.Random) -> _Snapshot:
+    countries = [{"name": "Testland", "image": None, "dial_code": "+0", "emoji": ""}]
+    names = KNOWN + [_random_name(rng) for _ in range(count - len(KNOWN))]
+    cities = [{"name": name, "country": "Testland", "population": rng.randint(1, 10 ** 6), "lat": None, "lng": None} for name in names]
+    return _Snapshot(cities, countries)
+
+
+def brute_force(snapshot: _Snapshot, query: str) -> set[int]:
+    """Name ids within the allowed edit distance of the query, checking every name"""
+    max_edits = _max_edits(len(query))
+    width = len(query) + max_edits
+    if not max_edits or width > _FUZZY_PREFIX_WIDTH:
+        return set()
+    distances = _prefix_distances(query, snapshot.name_codes[:, :width], snapshot.name_lengths.clip(max=width))
+    return set((distances <= max_edits).nonzero()[0].tolist())
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    started = time.perf_counter()
+    snapshot = build(count, rng)
+    print(f"index of {count} cities built in {time.perf_counter() - started:.1f}s")
+
+    failures = 0
+    for query, expected in TYPOS:
+        ranks = GeoIndex._fuzzy_ranks(snapshot, fold_name(query), None, 10, set())
+        found = [snapshot.cities[rank]["name"] for rank in ranks]
+        ok = expected in found
+        failures += not ok
+        print(f"{query!r:14} -> {found[:3]} {'ok' if ok else 'MISSING ' + expected}")
+
+    # The trigram filter must keep every name the brute force accepts. FUZZY_MAX_CANDIDATES then bounds the
+    # names checked exactly on purpose, its misses (names sharing few trigrams with the query) are only reported
+    queries = [fold_name(_typo(rng, rng.choice(snapshot.names))) for _ in range(500)]
+    name_ids = {name: name_id for name_id, name in enumerate(snapshot.names)}
+    default_cap = GeoConfig.FUZZY_MAX_CANDIDATES
+    missed = {}
+    for cap in (len(snapshot.names), default_cap):
+        GeoConfig.FUZZY_MAX_CANDIDATES = cap
+        missed[cap] = 0
+        for query in queries:
+            found = {name_ids[fold_name(snapshot.cities[rank]["name"])]
+                     for rank in GeoIndex._fuzzy_ranks(snapshot, query, None, 10 ** 6, set())}
+            missed[cap] += bool(brute_force(snapshot, query) - found)
+    GeoConfig.FUZZY_MAX_CANDIDATES = default_cap
+    print(f"random typos: trigram filter missed a brute force match in {missed[len(snapshot.names)]} of {len(queries)} queries, "
+          f"{missed[default_cap]} with the FUZZY_MAX_CANDIDATES={default_cap} cap")
+    missed = missed[len(snapshot.names)]
+
+    queries = [fold_name(_typo(rng, rng.choice(snapshot.names))) for _ in range(200)]
+    started = time.perf_counter()
+    for query in queries:
+        GeoIndex._fuzzy_ranks(snapshot, query, None, 10, set())
+    print(f"typo queries: {(time.perf_counter() - started) / len(queries) * 1000:.2f} ms each")
+    sys.exit(1 if failures or missed else 0)
+
+
+if __name__ == "__main__":
+    main()
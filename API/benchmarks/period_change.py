@@ -0,0 +1,68 @@
+"""calculate_period_change: the vectorized version against the row by row loop it replaced.
+
+Checks that both give the same frame on random closes, then times them from 10k to 1M rows. The loop is
+only timed up to --loop-max rows (100k by default), it takes minutes beyond that.
+
+    cd API && python -m benchmarks.period_change [--loop-max ROWS]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from api.v1.finance.functions import calculate_period_change
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def loop_period_change(data: pd.DataFrame) -> pd.DataFrame:
+    """The implementation before vectorization, kept as the reference"""
+    previous_close = data.iloc[0]['Close']
+    initial_close = previous_close
+    data['Interval Change (%)'] = 0.0
+    data['Total Change (%)'] = 0.0
+
+    for i in range(1, len(data)):
+        current_close = data.iloc[i]['Close']
+
+        period_growth = ((current_close - previous_close) / previous_close) * 100
+        data.at[data.index[i], 'Interval Change (%)'] = period_growth
+
+        total_growth = ((current_close - initial_close) / initial_close) * 100
+        data.at[data.index[i], 'Total Change (%)'] = total_growth
+
+        previous_close = current_close
+
+    return data
+
+
+def frame(rows: int, rng: np.random.Generator) -> pd.DataFrame:
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    index = pd.date_range("2000-01-01", periods=rows, freq="min", tz="America/New_York", name="Date")
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000}, index=index)
+
+
+def timed(func, data: pd.DataFrame) -> float:
+    started = time.perf_counter()
+    func(data)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    loop_max = int(sys.argv[sys.argv.index("--loop-max") + 1]) if "--loop-max" in sys.argv else 100_000
+    rng = np.random.default_rng(0)
+
+    data = frame(2000, rng)
+    same = calculate_period_change(data.copy()).equals(loop_period_change(data.copy()))
+    print(f"same output as the loop: {same}")
+
+    for rows in SIZES:
+        data = frame(rows, rng)
+        vectorized = timed(calculate_period_change, data.copy())
+        loop = timed(loop_period_change, data.copy()) if rows <= loop_max else None
+        loop_text = f"{loop:8.3f} s" if loop is not None else "     (skipped)"
+        print(f"{rows:>9} rows: loop {loop_text}, vectorized {vectorized * 1000:8.2f} ms")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""SMTP pooling: checks SMTPPool against a local SMTP stand-in, then compares it with a session per message.
+
+The stand-in is a minimal in-process SMTP server that accepts every message (and refuses recipients at
+refused.example), so it measures the client side only: a real server adds TLS, login and network latency
+to every new session, which makes reusing them matter more, not less.
+
+    cd API && python -m benchmarks.smtp_pool [messages]
+"""
+import sys
+import time
+import socket
+import smtplib
+import threading
+import socketserver
+from core.config import EmailConfig
+from core.smtp_pool import SMTPPool
+
+MESSAGE = b"Subject: Benchmark\nFrom: Benchmark <noreply@example.com>\n\n" + b"Hello there.\n" * 40
+RECIPIENTS = [f"user{number}@example.com" for number in range(10)]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        server: StandInServer = self.server
+        with server.lock:
+            server.sessions += 1
+            server.open.add(self.connection)
+        try:
+            self.reply("220 stand-in ready")
+            recipients = []
+            for line in self.rfile:
+                command = line.decode().strip().upper()
+                if command.startswith(("EHLO", "HELO")):
+                    self.reply("250 stand-in")
+                elif command.startswith("MAIL FROM"):
+                    recipients = []
+                    self.reply("250 OK")
+                elif command.startswith("RCPT TO"):
+                    if "@REFUSED.EXAMPLE" in command:
+                        self.reply("550 No such user")
+                    else:
+                        recipients.append(command)
+                        self.reply("250 OK")
+                elif command == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    for data in self.rfile:
+                        if data == b".\r\n":
+                            break
+                    with server.lock:
+                        server.transactions.append(len(recipients))
+                    self.reply("250 Queued")
+                elif command in ("RSET", "NOOP"):
+                    self.reply("250 OK")
+                elif command == "QUIT":
+                    self.reply("221 Bye")
+                    break
+                else:
+                    self.reply("502 Not implemented")
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.open.discard(self.connection)
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.transactions: list[int] = []
+        self.open: set = set()
+
+    def drop_sessions(self) -> None:
+        """Closes every open session, like a server timing out idle clients"""
+        with self.lock:
+            connections = list(self.open)
+        for connection in connections:
+            connection.shutdown(socket.SHUT_RDWR)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.sessions = 0
+            self.transactions.clear()
+
+
+def check(server: StandInServer, pool: SMTPPool) -> list[str]:
+    """Behaviour of the pool against the stand-in, returns the failed checks"""
+    failures = []
+    server.reset()
+    pool.send(MESSAGE, RECIPIENTS)
+    if server.transactions != [len(RECIPIENTS)]:
+        failures.append(f"10 recipients should be one transaction, got {server.transactions}")
+
+    for _ in range(20):
+        pool.send(MESSAGE, "someone@example.com")
+    if server.sessions != 1:
+        failures.append(f"sequential sends should share one session, opened {server.sessions}")
+
+    refused = pool.send(MESSAGE, ["someone@example.com", "nobody@refused.example"])
+    if list(refused) != ["nobody@refused.example"]:
+        failures.append(f"the refused recipient should be reported, got {refused}")
+    try:
+        pool.send(MESSAGE, "nobody@refused.example")
+        failures.append("a message refused for every recipient should raise")
+    except smtplib.SMTPRecipientsRefused:
+        pass
+    if server.sessions != 1:
+        failures.append(f"refused recipients should keep the session, opened {server.sessions}")
+
+    server.drop_sessions()
+    time.sleep(0.1)
+    transactions = len(server.transactions)
+    pool.send(MESSAGE, "someone@example.com")
+    if len(server.transactions) != transactions + 1 or server.sessions != 2:
+        failures.append("a session dropped by the server should be replaced and the message sent once")
+    return failures
+
+
+def session_per_message(host: str, port: int, to_addrs) -> None:
+    """How messages were sent before the pool"""
+    with smtplib.SMTP(host, port, timeout=EmailConfig.SMTP_TIMEOUT) as connection:
+        connection.sendmail(from_addr=EmailConfig.FROM_EMAIL, to_addrs=to_addrs, msg=MESSAGE)
+
+
+def rate(count: int, func) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    EmailConfig.SMTP_STARTTLS = False
+    EmailConfig.PASSWORD = None
+    EmailConfig.FROM_EMAIL = "noreply@example.com"
+
+    server = StandInServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    pool = SMTPPool(host, port, size=4, idle_timeout=60)
+
+    failures = check(server, pool)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print(f"stand-in checks: {'ok' if not failures else f'{len(failures)} failed'}")
+
+    print(f"session per message: {rate(messages, lambda: session_per_message(host, port, 'someone@example.com')):7.0f} msg/s")
+    print(f"pooled session:      {rate(messages, lambda: pool.send(MESSAGE, 'someone@example.com')):7.0f} msg/s")
+
+    batches = max(messages // len(RECIPIENTS), 1)
+    one_each = rate(batches, lambda: [pool.send(MESSAGE, recipient) for recipient in RECIPIENTS]) * len(RECIPIENTS)
+    together = rate(batches, lambda: pool.send(MESSAGE, RECIPIENTS)) * len(RECIPIENTS)
+    print(f"{len(RECIPIENTS)} recipients: {one_each:7.0f} rcpt/s one transaction each, {together:7.0f} rcpt/s in one transaction")
+
+    pool.close()
+    server.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Weather responses: building the body on every request against the bodies a WeatherReport keeps.
+
+Times the per-request CPU of /general and /current-temperature for one cached payload, response object
+included, the way the endpoints built them before (ORJSONResponse of a fresh dict) and now (Response of
+the bytes kept by the report). No network or Redis needed.
+
+    cd API && python -m benchmarks.weather_response [requests]
+"""
+import sys
+import timeit
+import orjson
+from fastapi.responses import ORJSONResponse, Response
+from api.v1.weather.functions import WeatherReport, build_general_weather, convert_temp
+
+# A /data/2.5/weather payload of OpenWeatherMap
+PAYLOAD = {
+    "coord": {"lon": 34.7818, "lat": 32.0853},
+    "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+    "base": "stations",
+    "main": {"temp": 299.52, "feels_like": 299.52, "temp_min": 298.71, "temp_max": 300.37, "pressure": 1012, "humidity": 61},
+    "visibility": 10000,
+    "wind": {"speed": 4.63, "deg": 290},
+    "clouds": {"all": 0},
+    "dt": 1729252800,
+    "sys": {"type": 2, "id": 2004982, "country": "IL", "sunrise": 1729222140, "sunset": 1729263185},
+    "timezone": 10800,
+    "id": 293397,
+    "name": "Tel Aviv",
+    "cod": 200,
+}
+
+
+def per_request_us(statement, requests: int) -> float:
+    return min(timeit.repeat(statement, number=requests, repeat=5)) / requests * 10 ** 6
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    report = WeatherReport(PAYLOAD)
+
+    same = orjson.loads(report.general_json) == orjson.loads(orjson.dumps(build_general_weather(PAYLOAD)))
+    print(f"same /general body: {same}")
+
+    built = per_request_us(lambda: ORJSONResponse(content=build_general_weather(PAYLOAD)), requests)
+    kept = per_request_us(lambda: Response(content=report.general_json, media_type="application/json"), requests)
+    print(f"/general:             {built:7.2f} us -> {kept:5.2f} us per request")
+
+    built = per_request_us(lambda: ORJSONResponse(content={"current temperature": convert_temp(PAYLOAD["main"]["temp"], "celsius")}), requests)
+    kept = per_request_us(lambda: Response(content=report.current_temp_json("celsius"), media_type="application/json"), requests)
+    print(f"/current-temperature: {built:7.2f} us -> {kept:5.2f} us per request")
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
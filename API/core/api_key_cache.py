@@ -0,0 +1,83 @@
+import asyncio
+from typing import Optional
+from cachetools import TTLCache
+from redis.exceptions import ConnectionError as RedisConnectionError
+from core.config import APIKeyCacheConfig, RedisConfig
+from core.db import db
+
+class APIKeyCache:
+    """Bounded TTL cache of API key -> user principal with negative caching of invalid keys.
+
+    Entries are dropped across workers when the Auth service publishes a rotated key on the
+    invalidation channel, the TTL bounds how long a revoked key can be served if a message is missed.
+    """
+
+    PRINCIPAL_FIELDS = {"_id": 1, "username": 1}
+
+    def __init__(self, maxsize: int, ttl: int, negative_ttl: int) -> None:
+        self._principals = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._invalid_keys = TTLCache(maxsize=maxsize, ttl=negative_ttl)
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, api_key: str) -> Optional[dict]:
+        principal = self._principals.get(api_key)
+        if principal is not None:
+            self.hits += 1
+            return principal
+        if api_key in self._invalid_keys:
+            self.negative_hits += 1
+            return None
+
+        self.misses += 1
+        user = await db.users_db.find_one({"api_key": api_key}, self.PRINCIPAL_FIELDS)
+        if user is None:
+            self._invalid_keys[api_key] = True
+            return None
+        principal = {"_id": str(user["_id"]), "username": user.get("username")}
+        self._principals[api_key] = principal
+        return principal
+
+    def invalidate(self, api_key: str) -> None:
+        self._principals.pop(api_key, None)
+        self._invalid_keys.pop(api_key, None)
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._principals.clear()
+        self._invalid_keys.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+            "size": len(self._principals),
+            "negative_size": len(self._invalid_keys)
+        }
+
+    async def listen_for_invalidations(self) -> None:
+        """Drop keys published on the invalidation channel, runs for the lifetime of the app"""
+        while True:
+            pubsub = db.redis.pubsub()
+            try:
+                await pubsub.subscribe(RedisConfig.API_KEY_INVALIDATION_CHANNEL)
+                # Messages may have been missed while we were not subscribed
+                self.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate(message["data"].decode("utf-8"))
+            except RedisConnectionError:
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+api_key_cache = APIKeyCache(
+    maxsize=APIKeyCacheConfig.MAX_SIZE,
+    ttl=APIKeyCacheConfig.TTL,
+    negative_ttl=APIKeyCacheConfig.NEGATIVE_TTL)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv() 
@@ -13,9 +14,55 @@ class APIConfig:
 class WeatherConfig:
     WEATHER_API_KEY = os.getenv("OPEN_WEATHER_API")
     WEATHER_API_URL = os.getenv("WEATHER_API_URL")
+    CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", 10000))
+    # Payloads younger than FRESH_TTL seconds are served as is, older ones up to STALE_TTL are served while refreshing
+    FRESH_TTL = float(os.getenv("WEATHER_FRESH_TTL", 120))
+    STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", 600))
+    MAX_BULK_LOCATIONS = int(os.getenv("WEATHER_MAX_BULK_LOCATIONS", 100))
+    BULK_CONCURRENCY = int(os.getenv("WEATHER_BULK_CONCURRENCY", 10))
+
+class FinanceConfig:
+    HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', 256))
+    # Seconds to keep stock history whose range includes today, and fully past ranges
+    LIVE_HISTORY_TTL = int(os.getenv('LIVE_HISTORY_TTL', 60))
+    PAST_HISTORY_TTL = int(os.getenv('PAST_HISTORY_TTL', 86400))
+    MAX_BATCH_TICKERS = int(os.getenv('MAX_BATCH_TICKERS', 200))
+    QUOTE_CACHE_SIZE = int(os.getenv('QUOTE_CACHE_SIZE', 4096))
+    QUOTE_TTL = int(os.getenv('QUOTE_TTL', 15))
+    # Rows rendered per chunk when streaming CSV and NDJSON exports
+    EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', 5000))
+    HISTORY_STORE_DIR = os.getenv('HISTORY_STORE_DIR', os.path.join(tempfile.gettempdir(), 'generalapi', 'history'))
+
+class GeoConfig:
+    # Seconds between reloads of the in-memory cities and countries index
+    INDEX_REFRESH_INTERVAL = int(os.getenv('GEO_INDEX_REFRESH_INTERVAL', 3600))
+    # Seconds a request waits for the first index load before failing with a 503
+    INDEX_READY_TIMEOUT = float(os.getenv('GEO_INDEX_READY_TIMEOUT', 10))
+    # City queries with fewer exact/prefix matches than this are completed with typo-tolerant matches
+    FUZZY_MIN_RESULTS = int(os.getenv('GEO_FUZZY_MIN_RESULTS', 10))
+    FUZZY_MAX_EDITS = int(os.getenv('GEO_FUZZY_MAX_EDITS', 2))
+    # Most candidate names checked with an exact edit distance per query
+    FUZZY_MAX_CANDIDATES = int(os.getenv('GEO_FUZZY_MAX_CANDIDATES', 128))
+    # Fields of the city documents holding their coordinates in degrees
+    CITY_LAT_FIELD = os.getenv('GEO_CITY_LAT_FIELD', 'lat')
+    CITY_LON_FIELD = os.getenv('GEO_CITY_LON_FIELD', 'lng')
+    # Cell size of the nearest city grid, about the distance between neighbouring cities in sparse areas
+    NEAREST_CELL_KM = float(os.getenv('GEO_NEAREST_CELL_KM', 50))
+    MAX_NEAREST_LIMIT = int(os.getenv('GEO_MAX_NEAREST_LIMIT', 100))
+    # Serialized /cities and /countries responses kept per (query, flags, limit)
+    RESPONSE_CACHE_SIZE = int(os.getenv('GEO_RESPONSE_CACHE_SIZE', 1024))
+
+class QRConfig:
+    # Total size of the rendered QR responses kept in memory
+    CACHE_MAX_BYTES = int(os.getenv('QR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    MAX_BATCH_SIZE = int(os.getenv('QR_MAX_BATCH_SIZE', 5000))
+    # QR codes rendered per worker thread call while streaming a batch
+    BATCH_CHUNK_SIZE = int(os.getenv('QR_BATCH_CHUNK_SIZE', 50))
 
 class MongoDBConfig:
     MONGODB_URI = os.getenv("MONGODB_URI")
+    MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))
+    MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", 0))
 
 class SMSConfig:
     SMS_SECRET = os.getenv('SMS_SECRET')
@@ -24,15 +71,84 @@ class SMSConfig:
 class EmailConfig:
     FROM_EMAIL = os.getenv('FROM_EMAIL')
     PASSWORD = os.getenv('PASSWORD')
+    SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+    SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+    SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+    SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', 30))
+    # Sessions open at the same time, and seconds an unused one is kept before reconnecting
+    SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', 4))
+    SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
 
 class RedisConfig:
     REDIS_URL = os.getenv('REDIS_URL')
     REDIS_PORT = int(os.getenv('REDIS_PORT'))
     REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
+    MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+    API_KEY_INVALIDATION_CHANNEL = os.getenv('API_KEY_INVALIDATION_CHANNEL', 'api_key_invalidation')
+
+class APIKeyCacheConfig:
+    MAX_SIZE = int(os.getenv('API_KEY_CACHE_SIZE', 10000))
+    # Upper bound in seconds for serving a revoked key if an invalidation message is missed
+    TTL = int(os.getenv('API_KEY_CACHE_TTL', 60))
+    NEGATIVE_TTL = int(os.getenv('API_KEY_NEGATIVE_CACHE_TTL', 10))
+
+class SingleFlightConfig:
+    # Coalesce identical upstream calls across workers through a Redis lease, not only inside a worker
+    REDIS_LEASE = os.getenv('SINGLEFLIGHT_REDIS_LEASE', 'false').lower() == 'true'
+    LEASE_TTL = float(os.getenv('SINGLEFLIGHT_LEASE_TTL', 5))
+    RESULT_TTL = float(os.getenv('SINGLEFLIGHT_RESULT_TTL', 1))
+    POLL_INTERVAL = float(os.getenv('SINGLEFLIGHT_POLL_INTERVAL', 0.05))
+
+class ItemPoolConfig:
+    # Items kept per /other category, refilled in the background when down to LOW_WATERMARK
+    CAPACITY = int(os.getenv('ITEM_POOL_CAPACITY', 50))
+    LOW_WATERMARK = int(os.getenv('ITEM_POOL_LOW_WATERMARK', 10))
+    REFILL_CONCURRENCY = int(os.getenv('ITEM_POOL_REFILL_CONCURRENCY', 5))
+    # Seconds before refilling again after a refill that found no new item (upstream down or exhausted)
+    REFILL_COOLDOWN = float(os.getenv('ITEM_POOL_REFILL_COOLDOWN', 30))
+
+class JobQueueConfig:
+    # "redis" to share jobs between processes, "memory" keeps them in this process only (tests and local development)
+    BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'redis')
+    # Worker tasks per queue in every process
+    WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', 2))
+    MAX_ATTEMPTS = int(os.getenv('JOB_QUEUE_MAX_ATTEMPTS', 5))
+    # Retry delays are drawn from [0, BACKOFF * 2 ** attempts] seconds
+    BACKOFF = float(os.getenv('JOB_QUEUE_BACKOFF', 2))
+    # Seconds a job and its status are kept
+    JOB_TTL = int(os.getenv('JOB_QUEUE_JOB_TTL', 86400))
+    MEMORY_MAX_JOBS = int(os.getenv('JOB_QUEUE_MEMORY_MAX_JOBS', 10000))
+    # Seconds a worker waits for a job before checking for due retries again
+    POLL_TIMEOUT = float(os.getenv('JOB_QUEUE_POLL_TIMEOUT', 1))
+    # Seconds a job may stay running before it is considered lost with its worker process and queued again
+    RUNNING_TIMEOUT = float(os.getenv('JOB_QUEUE_RUNNING_TIMEOUT', 600))
+    # Seconds between checks for lost jobs
+    STALE_CHECK_INTERVAL = float(os.getenv('JOB_QUEUE_STALE_CHECK_INTERVAL', 30))
+
+class ExecutorConfig:
+    # Threads for blocking work that releases the GIL (hashing, compression, network calls of blocking libraries)
+    THREAD_WORKERS = int(os.getenv('EXECUTOR_THREAD_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+    # Processes for pure-Python CPU work (QR rendering, Excel and HTML exports), 0 runs that work in the thread pool instead
+    PROCESS_WORKERS = int(os.getenv('EXECUTOR_PROCESS_WORKERS', os.cpu_count() or 1))
+    # Tasks of one type running at once in every process, as "type=limit,type=limit"
+    TASK_LIMITS = {task_type.strip(): int(limit) for task_type, limit in (
+        item.split('=') for item in os.getenv('EXECUTOR_TASK_LIMITS', 'qr=4,excel=2,html=2,yfinance=16').split(',') if item.strip())}
+    DEFAULT_TASK_LIMIT = int(os.getenv('EXECUTOR_DEFAULT_TASK_LIMIT', 8))
 
 class AppConfig:
     MODE = os.getenv('MODE')
 
+class HTTPConfig:
+    HTTP2 = os.getenv('HTTP_CLIENT_HTTP2', 'true').lower() == 'true'
+    TIMEOUT = float(os.getenv('HTTP_CLIENT_TIMEOUT', 10))
+    CONNECT_TIMEOUT = float(os.getenv('HTTP_CLIENT_CONNECT_TIMEOUT', 5))
+    MAX_CONNECTIONS = int(os.getenv('HTTP_CLIENT_MAX_CONNECTIONS', 100))
+    MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST', 20))
+    MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS', 20))
+    KEEPALIVE_EXPIRY = float(os.getenv('HTTP_CLIENT_KEEPALIVE_EXPIRY', 30))
+    RETRIES = int(os.getenv('HTTP_CLIENT_RETRIES', 2))
+    BACKOFF = float(os.getenv('HTTP_CLIENT_BACKOFF', 0.2))
+
 # -------------------------------------------------------------------------- URLS -------------------------------------------------------------------
 
 _LOCAL_URL = "127.0.0.1:8000"
@@ -0,0 +1,75 @@
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Optional
+import orjson
+from core.config import ItemPoolConfig
+from core.singleflight import SingleFlight
+
+# Every ItemPool created, filled by the app lifespan
+item_pools: list["ItemPool"] = []
+
+
+class ItemPool:
+    """Local buffer of random items from an upstream, served as ready-to-send JSON bytes.
+
+    A background refill tops the pool up to ItemPoolConfig.CAPACITY whenever it drops below the low
+    watermark, skipping items already in the pool. A refill that finds nothing new (the upstream is down,
+    or has fewer items than the pool holds) pauses refills for ItemPoolConfig.REFILL_COOLDOWN. Callers
+    only wait for the upstream when the pool is empty, and concurrent callers then share a single call.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[], Awaitable[Optional[dict]]], shape: Callable[[dict], dict]) -> None:
+        self.name = name
+        self.fetch = fetch
+        self.shape = shape
+        self._items: deque[bytes] = deque()
+        # The items of the pool, so an item is never pooled twice
+        self._pooled: set[bytes] = set()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._refill_after = 0.0
+        self._fallback = SingleFlight(f"pool:{name}")
+        item_pools.append(self)
+
+    async def _fetch_item(self) -> Optional[bytes]:
+        try:
+            data = await self.fetch()
+            return orjson.dumps(self.shape(data)) if data is not None else None
+        except Exception as e:
+            print(f"Failed to fetch an item for the {self.name} pool: {e}")
+            return None
+
+    async def refill(self) -> None:
+        # Bounded so an upstream with only a few items (or that keeps failing) does not keep us fetching
+        attempts, added = 0, 0
+        while len(self._items) < ItemPoolConfig.CAPACITY and attempts < 2 * ItemPoolConfig.CAPACITY:
+            batch = min(ItemPoolConfig.REFILL_CONCURRENCY, ItemPoolConfig.CAPACITY - len(self._items))
+            attempts += batch
+            items = await asyncio.gather(*(self._fetch_item() for _ in range(batch)))
+            if not any(items):
+                break
+            for item in items:
+                if item is not None and item not in self._pooled:
+                    self._pooled.add(item)
+                    self._items.append(item)
+                    added += 1
+        if not added:
+            self._refill_after = time.monotonic() + ItemPoolConfig.REFILL_COOLDOWN
+
+    def start_refill(self) -> None:
+        if (self._refill_task is None or self._refill_task.done()) and time.monotonic() >= self._refill_after:
+            self._refill_task = asyncio.create_task(self.refill())
+
+    async def get(self) -> Optional[bytes]:
+        """An item from the pool, or straight from the upstream when the pool is empty"""
+        if len(self._items) <= ItemPoolConfig.LOW_WATERMARK:
+            self.start_refill()
+        if self._items:
+            item = self._items.popleft()
+            self._pooled.discard(item)
+            return item
+        return await self._fallback.do(None, self._fetch_item)
+
+def fill_item_pools() -> None:
+    for pool in item_pools:
+        pool.start_refill()
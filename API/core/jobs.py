@@ -0,0 +1,209 @@
+import time
+import uuid
+import random
+import asyncio
+from typing import Callable, Optional
+import orjson
+from cachetools import TTLCache
+from core.config import JobQueueConfig
+from core.db import db
+from core.executors import executors
+
+class _RedisBackend:
+    """Jobs shared by every worker process: a JSON record per job, a list of ready job ids and a sorted set
+    of job ids waiting for a retry, scored by when they are due.
+
+    Popping moves the job id to a processing list, where it stays until the job is finished or rescheduled,
+    so the jobs of a worker process that crashed are found there and queued again. When each job was popped
+    is kept in a hash next to the list, a job is stale once it has been there longer than the running timeout.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.prefix = f"jobs:{name}"
+
+    async def save(self, job: dict) -> None:
+        await db.redis.set(f"{self.prefix}:{job['id']}", orjson.dumps(job), ex=JobQueueConfig.JOB_TTL)
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        job = await db.redis.get(f"{self.prefix}:{job_id}")
+        return orjson.loads(job) if job is not None else None
+
+    async def push(self, job_id: str) -> None:
+        await db.redis.lpush(f"{self.prefix}:queue", job_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        job_id = await db.redis.blmove(f"{self.prefix}:queue", f"{self.prefix}:processing", timeout, src="RIGHT", dest="LEFT")
+        if job_id is None:
+            return None
+        await db.redis.hset(f"{self.prefix}:processing_since", job_id, time.time())
+        return job_id.decode()
+
+    async def finish(self, job: dict, retry_delay: Optional[float]) -> None:
+        """Saves the job and takes it off the processing list, scheduling its retry in the same transaction"""
+        async with db.redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"{self.prefix}:{job['id']}", orjson.dumps(job), ex=JobQueueConfig.JOB_TTL)
+            if retry_delay is not None:
+                pipe.zadd(f"{self.prefix}:delayed", {job["id"]: time.time() + retry_delay})
+            pipe.lrem(f"{self.prefix}:processing", 1, job["id"])
+            pipe.hdel(f"{self.prefix}:processing_since", job["id"])
+            await pipe.execute()
+
+    async def _release(self, job_id: bytes) -> bool:
+        """Takes the job off the processing list, False if another worker already did"""
+        async with db.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(f"{self.prefix}:processing", 1, job_id)
+            pipe.hdel(f"{self.prefix}:processing_since", job_id)
+            removed, _ = await pipe.execute()
+        return bool(removed)
+
+    async def requeue_stale(self) -> None:
+        """Queues again the jobs popped more than JobQueueConfig.RUNNING_TIMEOUT ago and still on the processing list"""
+        now = time.time()
+        for job_id in await db.redis.lrange(f"{self.prefix}:processing", 0, -1):
+            job = await self.load(job_id.decode())
+            if job is not None and job["status"] not in ("done", "failed"):
+                # A worker that crashed right after popping never recorded the time, the timeout then starts now
+                await db.redis.hsetnx(f"{self.prefix}:processing_since", job_id, now)
+                since = await db.redis.hget(f"{self.prefix}:processing_since", job_id)
+                if since is None or now - float(since) < JobQueueConfig.RUNNING_TIMEOUT:
+                    continue
+                # Only the worker that removes the job from the processing list queues it
+                if await self._release(job_id):
+                    job.update(status="retrying", error="Interrupted", updated_at=time.time())
+                    await self.save(job)
+                    await self.push(job["id"])
+            else:
+                await self._release(job_id)
+        # Times recorded above for jobs finished meanwhile, pop records a time only after moving the job
+        recorded = await db.redis.hkeys(f"{self.prefix}:processing_since")
+        if recorded:
+            orphans = set(recorded) - set(await db.redis.lrange(f"{self.prefix}:processing", 0, -1))
+            if orphans:
+                await db.redis.hdel(f"{self.prefix}:processing_since", *orphans)
+
+    async def promote_due(self) -> None:
+        for job_id in await db.redis.zrangebyscore(f"{self.prefix}:delayed", 0, time.time()):
+            # Only the worker that removes the job from the delayed set queues it
+            if await db.redis.zrem(f"{self.prefix}:delayed", job_id):
+                await db.redis.lpush(f"{self.prefix}:queue", job_id)
+
+
+class _MemoryBackend:
+    """Jobs of this process only, lost on restart, for tests and local development"""
+
+    def __init__(self, name: str) -> None:
+        self._jobs = TTLCache(maxsize=JobQueueConfig.MEMORY_MAX_JOBS, ttl=JobQueueConfig.JOB_TTL)
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+
+    async def save(self, job: dict) -> None:
+        self._jobs[job["id"]] = dict(job)
+
+    async def load(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def push(self, job_id: str) -> None:
+        self._queue.put_nowait(job_id)
+
+    async def pop(self, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def finish(self, job: dict, retry_delay: Optional[float]) -> None:
+        await self.save(job)
+        if retry_delay is not None:
+            asyncio.get_running_loop().call_later(retry_delay, self._queue.put_nowait, job["id"])
+
+    async def requeue_stale(self) -> None:
+        pass
+
+    async def promote_due(self) -> None:
+        pass
+
+
+# Every JobQueue created, their workers are started by the app lifespan
+job_queues: list["JobQueue"] = []
+
+
+class JobQueue:
+    """Named queue of jobs run by background workers, with retries and a status per job.
+
+    handler is a blocking function run in the executor thread pool with the job payload. A job is retried with
+    exponential backoff and full jitter when the handler raises, until JobQueueConfig.MAX_ATTEMPTS.
+    The handler may update the payload in place (e.g. drop the recipients already served), the updated
+    payload is what the next attempt gets. Jobs run at least once: one interrupted by a shutdown or a
+    crashed worker process is queued again.
+    """
+
+    def __init__(self, name: str, handler: Callable[[dict], None]) -> None:
+        self.name = name
+        self.handler = handler
+        self._backend = _MemoryBackend(name) if JobQueueConfig.BACKEND == "memory" else _RedisBackend(name)
+        self._next_stale_check = 0.0
+        job_queues.append(self)
+
+    async def enqueue(self, payload: dict, owner: Optional[str] = None) -> str:
+        now = time.time()
+        job = {"id": uuid.uuid4().hex, "status": "queued", "attempts": 0, "error": None,
+               "owner": owner, "payload": payload, "created_at": now, "updated_at": now}
+        await self._backend.save(job)
+        await self._backend.push(job["id"])
+        return job["id"]
+
+    async def status(self, job_id: str, owner: Optional[str] = None) -> Optional[dict]:
+        """Public view of the job, None if it does not exist (anymore) or belongs to someone else"""
+        job = await self._backend.load(job_id)
+        if job is None or job["owner"] != owner:
+            return None
+        return {key: job[key] for key in ("id", "status", "attempts", "error", "created_at", "updated_at")}
+
+    async def _run(self, job_id: str) -> None:
+        job = await self._backend.load(job_id)
+        if job is None:
+            return
+        job.update(status="running", attempts=job["attempts"] + 1, updated_at=time.time())
+        await self._backend.save(job)
+
+        retry_delay = None
+        try:
+            await executors.run_thread(f"job:{self.name}", self.handler, job["payload"])
+        except asyncio.CancelledError:
+            # Shutting down, the job goes back to the queue for the next worker
+            job.update(status="retrying", error="Interrupted by shutdown", updated_at=time.time())
+            await self._backend.finish(job, 0)
+            raise
+        except Exception as e:
+            job["error"] = str(e)
+            if job["attempts"] >= JobQueueConfig.MAX_ATTEMPTS:
+                job["status"] = "failed"
+            else:
+                job["status"] = "retrying"
+                retry_delay = random.uniform(0, JobQueueConfig.BACKOFF * 2 ** job["attempts"])
+        else:
+            job.update(status="done", error=None)
+        job["updated_at"] = time.time()
+        # Saved with the retry scheduled together so the next attempt never finds an older state
+        await self._backend.finish(job, retry_delay)
+
+    async def work(self) -> None:
+        """Worker loop, runs one job at a time until cancelled"""
+        while True:
+            try:
+                if time.monotonic() >= self._next_stale_check:
+                    self._next_stale_check = time.monotonic() + JobQueueConfig.STALE_CHECK_INTERVAL
+                    await self._backend.requeue_stale()
+                await self._backend.promote_due()
+                job_id = await self._backend.pop(JobQueueConfig.POLL_TIMEOUT)
+                if job_id is not None:
+                    await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job queue {self.name} worker error: {e}")
+                await asyncio.sleep(1)
+
+def start_job_workers() -> list[asyncio.Task]:
+    """JobQueueConfig.WORKERS worker tasks per queue, to be cancelled on shutdown"""
+    return [asyncio.create_task(queue.work()) for queue in job_queues for _ in range(JobQueueConfig.WORKERS)]
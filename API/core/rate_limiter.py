@@ -1,15 +1,82 @@
+import math
+import hashlib
 from functools import wraps
-from fastapi import Request, HTTPException
-from core.db import redis_client
+from fastapi import Request, Response, HTTPException
+from redis.exceptions import NoScriptError
+from core.db import db
 from core.config import AppConfig
 
+SECONDS_PER_DAY = 86400
+
+# Fixed per-second and per-day windows checked and incremented atomically on the Redis server.
+# KEYS: [per second key, per day key]
+# ARGV: [max requests per second, max requests per day (0 means no daily limit), day window length in seconds]
+# Returns: {allowed (1/0), blocking window (0 = none, 1 = second, 2 = day), remaining per second,
+#           remaining per day (-1 if no daily limit), milliseconds until the blocking/next window resets}
+_RATE_LIMIT_SCRIPT = """
+local max_sec = tonumber(ARGV[1])
+local max_day = tonumber(ARGV[2])
+
+local sec_count = tonumber(redis.call('GET', KEYS[1]) or '0')
+if sec_count >= max_sec then
+    return {0, 1, 0, -1, redis.call('PTTL', KEYS[1])}
+end
+
+local day_count = 0
+if max_day > 0 then
+    day_count = tonumber(redis.call('GET', KEYS[2]) or '0')
+    if day_count >= max_day then
+        return {0, 2, max_sec - sec_count, 0, redis.call('PTTL', KEYS[2])}
+    end
+end
+
+sec_count = redis.call('INCR', KEYS[1])
+if sec_count == 1 then
+    redis.call('PEXPIRE', KEYS[1], 1000)
+end
+
+local remaining_day = -1
+local reset = redis.call('PTTL', KEYS[1])
+if max_day > 0 then
+    day_count = redis.call('INCR', KEYS[2])
+    if day_count == 1 then
+        redis.call('EXPIRE', KEYS[2], tonumber(ARGV[3]))
+    end
+    remaining_day = max_day - day_count
+    reset = redis.call('PTTL', KEYS[2])
+end
+
+return {1, 0, max_sec - sec_count, remaining_day, reset}
+"""
+
+_RATE_LIMIT_SHA = hashlib.sha1(_RATE_LIMIT_SCRIPT.encode("utf-8")).hexdigest()
+
+
+async def check_rate_limit(redis_key_sec: str, redis_key_day: str, max_requests_per_second: int, max_requests_per_day: int = None) -> dict:
+    """Evaluate both windows in a single round-trip and return the decision with the remaining quota"""
+    args = [redis_key_sec, redis_key_day, max_requests_per_second, max_requests_per_day or 0, SECONDS_PER_DAY]
+    try:
+        result = await db.redis.evalsha(_RATE_LIMIT_SHA, 2, *args)
+    except NoScriptError:
+        # First call on this Redis server (or after a SCRIPT FLUSH), EVAL also caches the script for EVALSHA
+        result = await db.redis.eval(_RATE_LIMIT_SCRIPT, 2, *args)
+    allowed, window, remaining_sec, remaining_day, reset_ms = result
+    return {
+        "allowed": bool(allowed),
+        "window": {0: None, 1: "second", 2: "day"}[window],
+        "remaining_per_second": remaining_sec,
+        "remaining_per_day": None if remaining_day < 0 else remaining_day,
+        "reset_seconds": max(reset_ms, 0) / 1000
+    }
+
+
 def rate_limiter(max_requests_per_second: int, max_requests_per_day: int = None):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             if AppConfig.MODE == "development":
                 return await func(*args, **kwargs)
-            
+
             request: Request = kwargs['request']
             if request is None:
                 raise HTTPException(
@@ -19,39 +86,29 @@ def rate_limiter(max_requests_per_second: int, max_requests_per_day: int = None)
 
             client_ip = request.client.host
 
-            # Rate limit per second
             redis_key_sec = f"rate_limit:{client_ip}:per_second:{func.__name__}"
-            sec_res = redis_client.get(redis_key_sec)
-            if sec_res and int(sec_res.decode("utf-8")) >= max_requests_per_second:
+            redis_key_day = f"rate_limit:{client_ip}:per_day:{func.__name__}"
+            decision = await check_rate_limit(redis_key_sec, redis_key_day, max_requests_per_second, max_requests_per_day)
+            if not decision["allowed"]:
                 raise HTTPException(
-                    detail={"error": "Too many requests per second"},
-                    status_code=429
+                    detail={"error": f"Too many requests per {decision['window']}", "retry_after": decision["reset_seconds"]},
+                    status_code=429,
+                    headers={"Retry-After": str(max(math.ceil(decision["reset_seconds"]), 1))}
                 )
 
-            # Rate limit per day
-            if max_requests_per_day is not None:
-                redis_key_day = f"rate_limit:{client_ip}:per_day:{func.__name__}"
-                day_res = redis_client.get(redis_key_day)
-                if day_res and int(day_res.decode("utf-8")) >= max_requests_per_day:
-                    raise HTTPException(
-                        detail={"error": "Too many requests per day"},
-                        status_code=429
-                    )
-                
             try:
-                # Increment the request count for per second rate limit
-                redis_client.incr(redis_key_sec)
-                redis_client.expire(redis_key_sec, 1)  # Expire in 1 second
-
-                # Increment the request count for per day rate limit
-                if max_requests_per_day is not None:
-                    redis_client.incr(redis_key_day)
-                    redis_client.expire(redis_key_day, 86400)  # Expire in 1 day (86400 seconds)
-
                 # Call the original function with the provided arguments
-                return await func(*args, **kwargs)
+                response = await func(*args, **kwargs)
+                if isinstance(response, Response):
+                    response.headers["X-RateLimit-Remaining-Second"] = str(decision["remaining_per_second"])
+                    if decision["remaining_per_day"] is not None:
+                        response.headers["X-RateLimit-Remaining-Day"] = str(decision["remaining_per_day"])
+                    response.headers["X-RateLimit-Reset"] = str(decision["reset_seconds"])
+                return response
+            except HTTPException:
+                raise
             except Exception as e:
-                return HTTPException(
+                raise HTTPException(
                     detail={"error": str(e)},
                     status_code=500
                 )
@@ -0,0 +1,65 @@
+import asyncio
+from contextlib import suppress
+from typing import Any, Awaitable, Callable, Hashable
+import orjson
+from redis.exceptions import RedisError
+from core.config import SingleFlightConfig
+from core.db import db
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into a single execution and shares its result.
+
+    Calls are always coalesced inside the worker. With redis_lease the worker that takes a Redis lease for
+    the key runs the call and publishes the result for a short time, the other workers wait for it instead
+    of calling the upstream themselves, so results must be JSON serializable in that mode.
+    """
+
+    def __init__(self, name: str, redis_lease: bool = False) -> None:
+        self.name = name
+        self.redis_lease = redis_lease
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            # Runs in its own task, detached from the caller that started it
+            task = asyncio.create_task(self._call(key, fn))
+            # Retrieves the exception when every caller went away before the call finished
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._calls[key] = task
+        # Shielded so a cancelled caller, the first one included, does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    async def _call(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await (self._do_leased(key, fn) if self.redis_lease else fn())
+        finally:
+            self._calls.pop(key, None)
+
+    async def _do_leased(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        lease_key = f"singleflight:{self.name}:{key}:lease"
+        result_key = f"singleflight:{self.name}:{key}:result"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SingleFlightConfig.LEASE_TTL
+        try:
+            while loop.time() < deadline:
+                result = await db.redis.get(result_key)
+                if result is not None:
+                    return orjson.loads(result)
+                if await db.redis.set(lease_key, b"1", nx=True, px=int(SingleFlightConfig.LEASE_TTL * 1000)):
+                    break
+                await asyncio.sleep(SingleFlightConfig.POLL_INTERVAL)
+            else:
+                # The lease holder did not publish in time, call the upstream ourselves
+                return await fn()
+        except RedisError:
+            return await fn()
+
+        try:
+            result = await fn()
+            with suppress(RedisError):
+                await db.redis.set(result_key, orjson.dumps(result), px=int(SingleFlightConfig.RESULT_TTL * 1000))
+            return result
+        finally:
+            with suppress(RedisError):
+                await db.redis.delete(lease_key)
@@ -1,26 +1,59 @@
-import smtplib
+import unicodedata
 from datetime import datetime
-from typing import Optional
+from functools import wraps
+from typing import Optional, Union
 import re
 from fastapi import HTTPException, Header
 from cachetools import LRUCache, TTLCache
+from cachetools.keys import hashkey
 from core.config import EmailConfig
-from core.db import users_db
+from core.api_key_cache import api_key_cache
+from core.smtp_pool import smtp_pool
 
 cache = LRUCache(maxsize=2048)
 timed_cache = TTLCache(ttl=120, maxsize=2048)
 
+_NAME_SEPARATORS = re.compile(r"[\s\-'.]+")
+
+def fold_name(name: str) -> str:
+    """Fold case, diacritics and separators so "Tel-Aviv", "tel aviv" and "São Paulo"/"Sao Paulo" compare equal.
+    The key for city and country names everywhere (geo index, weather cache)"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NAME_SEPARATORS.sub(" ", stripped.casefold()).strip()
+
+
+def async_cached(cache):
+    """Like cachetools.cached but for coroutine functions, caches the awaited result instead of the coroutine"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = hashkey(*args, **kwargs)
+            try:
+                return cache[key]
+            except KeyError:
+                pass
+            result = await func(*args, **kwargs)
+            try:
+                cache[key] = result
+            except ValueError:
+                pass  # value too large
+            return result
+        return wrapper
+    return decorator
+
 
 def validate_email(email: str) -> bool:
     email_regex = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
     return re.match(email_regex, email) is not None
 
 def validate_input(input_str: str) -> bool:
-    return bool(re.match(r'^[a-zA-Z0-9\s]*$', input_str))
+    # Letters and digits of any script, whitespace and the separators found in place names ("Tel-Aviv", "N'Djamena", "St. Louis")
+    return bool(re.match(r"^(?:[^\W_]|[\s'.\-])*$", input_str))
 
 
 async def get_api_key(x_api_key: str = Header(...)):
-    user = users_db.find_one({"api_key": x_api_key})
+    user = await api_key_cache.get(x_api_key)
     if user is None:
         raise HTTPException(status_code=403, detail="Invalid API key")
     return user
@@ -34,11 +67,9 @@ def create_email_message(from_user: str, msg: str, subject: str) -> str:
     message = message.encode('utf-8')
     return message
 
-def send_email(message: str, to_user: str) -> None:
-    with smtplib.SMTP("smtp.gmail.com", 587) as connection:
-        connection.starttls()
-        connection.login(EmailConfig.FROM_EMAIL, EmailConfig.PASSWORD)
-        connection.sendmail(from_addr=EmailConfig.FROM_EMAIL, to_addrs=to_user, msg=message)
+def send_email(message: str, to_user: Union[str, list[str]]) -> dict:
+    """Blocking, sends to every recipient in one transaction over a pooled session and returns the refused ones"""
+    return smtp_pool.send(message, to_user)
 
 def get_current_date() -> str:
     return datetime.now().strftime("%d-%m-%Y")
@@ -1,13 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 from core.config import Docs, Messages, URLS
+from core.db import db
+from core.http_client import http_client
+from core.api_key_cache import api_key_cache
+from core.jobs import start_job_workers
+from core.item_pool import fill_item_pools
+from core.smtp_pool import smtp_pool
+from core.executors import executors
 from starlette.middleware.base import BaseHTTPMiddleware
 from api.v1 import v1_router
+from api.v1.geo.index import geo_index
 
 # ----------------------------------------------- App Initialization ----------------------------------------------------------------------
 
-app = FastAPI(title="GeneralAPI",description=Docs.DESCRIPTION, version=Docs.VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    await http_client.connect()
+    invalidation_task = asyncio.create_task(api_key_cache.listen_for_invalidations())
+    geo_index_task = asyncio.create_task(geo_index.refresh_periodically())
+    job_worker_tasks = start_job_workers()
+    fill_item_pools()
+    yield
+    for task in job_worker_tasks:
+        task.cancel()
+    # Interrupted jobs are queued again by their workers, which still need Redis for it
+    await asyncio.gather(*job_worker_tasks, return_exceptions=True)
+    geo_index_task.cancel()
+    invalidation_task.cancel()
+    smtp_pool.close()
+    executors.shutdown()
+    await http_client.close()
+    await db.close()
+
+app = FastAPI(title="GeneralAPI",description=Docs.DESCRIPTION, version=Docs.VERSION, lifespan=lifespan)
 
 # ----------------------------------------------- Enable CORS for all origins -------------------------------------------------------------
 
@@ -36,6 +66,10 @@ app.add_middleware(CustomCORSMiddleware)
 #     allow_headers=["*"],
 # )
 
+@app.get("/stats", include_in_schema=False)
+async def stats():
+    return ORJSONResponse(status_code=200, content={"api_key_cache": api_key_cache.stats(), "executors": executors.stats()})
+
 @app.exception_handler(404)
 async def custom_404_handler(_, __):
     return ORJSONResponse(status_code=404, content=Messages.MAIN_404_MESSAGE)
@@ -1,25 +1,23 @@
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
-import requests
 from fastapi import APIRouter, HTTPException, Depends, Response, status, Cookie
 from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from core.config import URLS, GoogleConfig, Secrets, Messages
-from core.db import users_db, redis_client
+from core.db import db
+from core.executors import executors
+from core.http_client import http_client
 from core.utils import validate_email, create_email_message, send_email
 from .models import Register, TokenResponse, UserSignin, Email, User, ConfirmResetPassword
-from .utils import (get_password_hash, create_api_key, get_user, generate_verification_token, set_cookies,
-                            startup_event, create_access_token, authenticate_user, get_current_active_user, get_current_user, 
+from .utils import (get_password_hash, create_api_key, invalidate_api_keys, get_user, generate_verification_token, set_cookies,
+                            create_access_token, authenticate_user, get_current_active_user, get_current_user, 
                             ACCESS_TOKEN_EXPIRE_MINUTES,UserSearchField)
 
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Add the background task to remove expired tokens and unverified users from DB
-router.add_event_handler("startup", startup_event)
-
 # ---------------------------------------------------------------- Endpoints ----------------------------------------------------------------
 
 @router.get("/google/login", response_class=ORJSONResponse)
@@ -39,15 +37,15 @@ async def auth_google(code: str, response: Response):
         "redirect_uri": URLS.GOOGLE_REDIRECT_URI,
         "grant_type": "authorization_code",
     }
-    google_response: dict = requests.post(token_url, data=data).json()
+    google_response: dict = (await http_client.post(token_url, data=data)).json()
     access_token: str = google_response.get("access_token")
-    user_info: requests.Response = requests.get("https://www.googleapis.com/oauth2/v1/userinfo", headers={"Authorization": f"Bearer {access_token}"})
+    user_info = await http_client.get("https://www.googleapis.com/oauth2/v1/userinfo", headers={"Authorization": f"Bearer {access_token}"})
 
     user_info_json: dict = user_info.json()
     email: str = user_info_json.get("email")
     username: str = user_info_json.get("name", email.split("@")[0])
     
-    user_record: Optional[User] = get_user(UserSearchField.EMAIL, email)
+    user_record: Optional[User] = await get_user(UserSearchField.EMAIL, email)
     
     # If user doesn't exist, create a new user record
     if not user_record:
@@ -60,10 +58,10 @@ async def auth_google(code: str, response: Response):
             "created_at": datetime.now(),
             "active": True
         }
-        users_db.insert_one(user_data)
-        user_record = get_user(UserSearchField.EMAIL, email)
+        await db.users_db.insert_one(user_data)
+        user_record = await get_user(UserSearchField.EMAIL, email)
 
-    tokens: dict = set_cookies(username=user_record['username'], response=response)
+    tokens: dict = await set_cookies(username=user_record['username'], response=response)
     
     return TokenResponse(access_token=tokens['access_token'], refresh_token=tokens['refresh_token'])
 
@@ -73,13 +71,13 @@ async def register(user: Register):
     """Create a user, create a verification token and send a verification email"""
     if not validate_email(user.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
-    if get_user(UserSearchField.USERNAME, user.username):
+    if await get_user(UserSearchField.USERNAME, user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
-    if get_user(UserSearchField.EMAIL, user.email):
+    if await get_user(UserSearchField.EMAIL, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password: str = get_password_hash(user.password)
-    verification_token: str = generate_verification_token()
+    hashed_password: str = await get_password_hash(user.password)
+    verification_token: str = await generate_verification_token()
 
     user_data: User = {
         "username": user.username,
@@ -91,25 +89,25 @@ async def register(user: Register):
         "created_at": datetime.now(),
         "active": True
     }
-    new_user = users_db.insert_one(user_data)
+    new_user = await db.users_db.insert_one(user_data)
     message = create_email_message(
         from_user='GeneralAPI', 
         msg=f"{Messages.ACCOUNT_VERIFY_EMAIL_MESSAGE}{new_user.inserted_id}/{verification_token}",
         subject='Verify your account')
-    send_email(message=message, to_user=user.email)
+    await executors.run_thread("email", send_email, message, user.email)
 
     return ORJSONResponse(content={"message":"User create successfuly"}, status_code=200)
 
 @router.post("/login", response_model=TokenResponse)
 async def login_for_tokens(user: UserSignin, response: Response):
-    user_record = authenticate_user(user.username, user.password)
-    tokens = set_cookies(username=user_record['username'], response=response)
+    user_record = await authenticate_user(user.username, user.password)
+    tokens = await set_cookies(username=user_record['username'], response=response)
     
     return TokenResponse(access_token=tokens['access_token'], refresh_token=tokens['refresh_token'])
 
 @router.post("/logout", status_code=204)
 async def logout(response: Response ,current_user: User = Depends(get_current_user)):
-    redis_client.delete(f"refresh_token:{current_user['username']}")
+    await db.redis.delete(f"refresh_token:{current_user['username']}")
 
     response.delete_cookie(key='access_token', path='/')
     response.delete_cookie(key='refresh_token', path='/')
@@ -129,7 +127,7 @@ async def refresh(response: Response, refresh_token: str = Cookie(None)):
     if username == None:
         raise token_exception
     
-    if not redis_client.exists(f"refresh_token:{username}"):
+    if not await db.redis.exists(f"refresh_token:{username}"):
         raise token_exception
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -143,14 +141,15 @@ async def refresh(response: Response, refresh_token: str = Cookie(None)):
 
 @router.get("/verify-email", response_class=ORJSONResponse)
 async def verify_email(uid: str, token: str):
-    user_record = get_user(UserSearchField.VERIFICATION_TOKEN, token)
+    user_record = await get_user(UserSearchField.VERIFICATION_TOKEN, token)
 
     if not user_record or str(user_record["_id"]) != uid:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
     
-    api_key: str = create_api_key()
+    api_key: str = await create_api_key()
 
-    users_db.update_one({"_id": user_record["_id"]}, {"$set": {"verified": True, "api_key":api_key}, "$unset": {"verification_token": ""}})
+    await db.users_db.update_one({"_id": user_record["_id"]}, {"$set": {"verified": True, "api_key":api_key}, "$unset": {"verification_token": ""}})
+    await invalidate_api_keys(api_key)
     
     return ORJSONResponse(status_code=200, content={"message":"User verified successfuly", "api-key":api_key})
 
@@ -160,51 +159,54 @@ async def verify_email(uid: str, token: str):
 async def login(user_record: User = Depends(get_current_active_user)):
     """Get API key""" 
     if user_record["api_key"] is None:
-        new_api_key = create_api_key()
-        users_db.update_one({"username": user_record['username']}, {"$set": {"api_key": new_api_key}})
+        new_api_key = await create_api_key()
+        await db.users_db.update_one({"username": user_record['username']}, {"$set": {"api_key": new_api_key}})
+        await invalidate_api_keys(new_api_key)
         return ORJSONResponse(status_code=200, content={"api_key": new_api_key})
     return ORJSONResponse(status_code=200, content={"api_key": user_record["api_key"]})
 
 @router.get("/reset-api-key")
 async def reset_api_key(user: User = Depends(get_current_active_user)) -> ORJSONResponse:    
-    new_api_key = create_api_key()
-    users_db.update_one({"username": user['username']}, {"$set": {"api_key": new_api_key}})
+    new_api_key = await create_api_key()
+    await db.users_db.update_one({"username": user['username']}, {"$set": {"api_key": new_api_key}})
+    # Revoke the old key and clear any negative cache entry for the new one
+    await invalidate_api_keys(user['api_key'], new_api_key)
     return ORJSONResponse(status_code=200, content={"api_key": new_api_key})
 
 # ----------------------------------- Password Reset ------------------------------------------
 
 @router.post("/forgot-password", response_class=ORJSONResponse)
 async def forgot_password(req: Email):
-    user_record: User = get_user(UserSearchField.EMAIL, req.email)
+    user_record: User = await get_user(UserSearchField.EMAIL, req.email)
     
     if not user_record or not user_record["verified"] or not user_record["active"] or not user_record["password"]:
         return ORJSONResponse(content={"message": "Password-reset email sent"}, status_code=200)
       
     # Generating the reset token for the confimation of the password reset, a new password hash, and a date for deleting the token and new password after 15 minutes
-    reset_token = generate_verification_token()
+    reset_token = await generate_verification_token()
     reset_token_created_at = datetime.now()
     
     # Adding the reset token date and new password hash to the user record
-    users_db.update_one({"_id": user_record["_id"]}, {"$set": {"reset_token": reset_token, "reset_token_created_at": reset_token_created_at}})
+    await db.users_db.update_one({"_id": user_record["_id"]}, {"$set": {"reset_token": reset_token, "reset_token_created_at": reset_token_created_at}})
     
     message = create_email_message(
         from_user='GeneralAPI',
         msg=f"{Messages.CHANGE_PASSWORD_EMAIL_MESSAGE}{reset_token}/{str(user_record['_id'])}",
         subject='Reset your password')
-    send_email(message=message, to_user=req.email)
+    await executors.run_thread("email", send_email, message, req.email)
     
     return ORJSONResponse(content={"message": "Password reset email sent"}, status_code=200)
 
 
 @router.post("/confirm-reset-password", response_class=ORJSONResponse)
 async def reset_password(creds: ConfirmResetPassword):
-    user_record = get_user(UserSearchField.RESET_TOKEN, creds.token)
+    user_record = await get_user(UserSearchField.RESET_TOKEN, creds.token)
     
     if not user_record or datetime.now() > user_record["reset_token_created_at"] + timedelta(minutes=15) or str(user_record["_id"]) != creds.user:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
     
-    new_password_hash: str = get_password_hash(creds.new_password)
+    new_password_hash: str = await get_password_hash(creds.new_password)
 
-    users_db.update_one({"_id": user_record["_id"]}, {"$set": {"password": new_password_hash}, "$unset": {"reset_token": "", "reset_token_created_at":""}})
+    await db.users_db.update_one({"_id": user_record["_id"]}, {"$set": {"password": new_password_hash}, "$unset": {"reset_token": "", "reset_token_created_at":""}})
     
     return ORJSONResponse(content={"message": "Password reset successful"}, status_code=200)
\ No newline at end of file
@@ -8,8 +8,9 @@ from datetime import datetime, timedelta, timezone, UTC
 from fastapi import status, HTTPException, Cookie, Depends, Response
 from jwt.exceptions import InvalidTokenError
 from .models import TokenData, User
-from core.db import users_db, redis_client
-from core.config import Secrets, AppConfig, URLS
+from core.db import db
+from core.executors import executors
+from core.config import Secrets, AppConfig, URLS, RedisConfig
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 30
@@ -22,27 +23,37 @@ class UserSearchField(Enum):
     RESET_TOKEN = "reset_token"
 
 
-def get_password_hash(password: str) -> str:
+def _hash_password(password: str) -> str:
     salt = hashlib.sha256(Secrets.SECRET_KEY.encode('utf-8')).digest()
     key = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 1000)
     return key.hex()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    stored_password_hash = get_password_hash(plain_password)
+async def get_password_hash(password: str) -> str:
+    # pbkdf2_hmac releases the GIL, a thread is enough to keep it off the event loop
+    return await executors.run_thread("password", _hash_password, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    stored_password_hash = await get_password_hash(plain_password)
     return secrets.compare_digest(stored_password_hash, hashed_password)
 
-def create_api_key() -> str:
+async def create_api_key() -> str:
     """Generate a unique API key"""
     while True:
         api_key = secrets.token_hex(64)
-        if not users_db.find_one({"api_key": api_key}):
+        if not await db.users_db.find_one({"api_key": api_key}):
             return api_key
 
-def generate_verification_token() -> str:
+async def invalidate_api_keys(*api_keys: Optional[str]) -> None:
+    """Tell every API worker to drop its cached entries (valid or invalid) for these keys"""
+    for api_key in api_keys:
+        if api_key:
+            await db.redis.publish(RedisConfig.API_KEY_INVALIDATION_CHANNEL, api_key)
+
+async def generate_verification_token() -> str:
     """Generate a unique verification token"""
     while True:
         verification_token = secrets.token_urlsafe(64)
-        if not users_db.find_one({"verification_token": verification_token}):
+        if not await db.users_db.find_one({"verification_token": verification_token}):
             return verification_token
 
 async def remove_expired() -> None:
@@ -51,31 +62,31 @@ async def remove_expired() -> None:
     while True:
         current_time = datetime.now(timezone.utc)
         # Remove expired reset password tokens
-        expired_tokens = users_db.find({"reset_token_created_at": {"$lt": current_time - expiration_time}})
-        for token in expired_tokens:
-            await users_db.update_one({"_id": token["_id"]}, {"$unset": {"reset_token": "", "reset_token_created_at": ""}})
+        expired_tokens = db.users_db.find({"reset_token_created_at": {"$lt": current_time - expiration_time}})
+        async for token in expired_tokens:
+            await db.users_db.update_one({"_id": token["_id"]}, {"$unset": {"reset_token": "", "reset_token_created_at": ""}})
         
         # Remove unverified users
-        expired_unverified_users = users_db.find({
+        expired_unverified_users = db.users_db.find({
             "$and": [
                 {"created_at": {"$lt": current_time - expiration_time}},
                 {"verified": False}
             ]
         })
-        for user in expired_unverified_users:
-            await users_db.delete_one({"_id": user["_id"], "verified": False})
+        async for user in expired_unverified_users:
+            await db.users_db.delete_one({"_id": user["_id"], "verified": False})
 
         await asyncio.sleep(60)
 
 
-def get_user(search_field: UserSearchField, query: str) -> Optional[User]:
-    user_record: User = users_db.find_one({search_field.value: query})
+async def get_user(search_field: UserSearchField, query: str) -> Optional[User]:
+    user_record: User = await db.users_db.find_one({search_field.value: query})
     return user_record
 
 
-def authenticate_user(username: str, password: str) -> User:
-    user_record: User = users_db.find_one({"username": username})
-    if not user_record or not user_record['password'] or not verify_password(password, user_record['password']):
+async def authenticate_user(username: str, password: str) -> User:
+    user_record: User = await db.users_db.find_one({"username": username})
+    if not user_record or not user_record['password'] or not await verify_password(password, user_record['password']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -120,7 +131,7 @@ async def get_current_user(access_token: Optional[str] = Cookie(None)) -> User:
     except InvalidTokenError:
         raise credentials_exception
     
-    user: Optional[User] = get_user(UserSearchField.USERNAME, token_data.username)
+    user: Optional[User] = await get_user(UserSearchField.USERNAME, token_data.username)
     if user is None:
         raise credentials_exception
     
@@ -131,7 +142,7 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def set_cookies(username: str, response: Response) -> dict[str, str]:
+async def set_cookies(username: str, response: Response) -> dict[str, str]:
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
@@ -143,7 +154,7 @@ def set_cookies(username: str, response: Response) -> dict[str, str]:
     )
     
     # Store refresh token in Redis with expiration time
-    redis_client.setex(f"refresh_token:{username}", int(refresh_token_expires.total_seconds()), refresh_token)
+    await db.redis.setex(f"refresh_token:{username}", int(refresh_token_expires.total_seconds()), refresh_token)
     
     # Calculate expiration times
     access_token_expiration = datetime.now(UTC) + access_token_expires
@@ -171,6 +182,3 @@ def set_cookies(username: str, response: Response) -> dict[str, str]:
         domain=URLS.FRONTEND_URL[0]
     )
     return {"access_token": access_token, "refresh_token": refresh_token}
-
-async def startup_event() -> None:
-    asyncio.create_task(remove_expired())
\ No newline at end of file
@@ -1,15 +1,19 @@
-from os import getenv
+from os import getenv, cpu_count
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class DBConfig:
     MONGODB_URI: str = getenv("MONGODB_URI")
+    MAX_POOL_SIZE: int = int(getenv("MONGODB_MAX_POOL_SIZE", 100))
+    MIN_POOL_SIZE: int = int(getenv("MONGODB_MIN_POOL_SIZE", 0))
 
 class RedisConfig:    
     REDIS_URL: str = getenv('REDIS_URL')
     REDIS_PORT: int = int(getenv('REDIS_PORT'))
     REDIS_PASSWORD: str = getenv('REDIS_PASSWORD')
+    MAX_CONNECTIONS: int = int(getenv('REDIS_MAX_CONNECTIONS', 50))
+    API_KEY_INVALIDATION_CHANNEL: str = getenv('API_KEY_INVALIDATION_CHANNEL', 'api_key_invalidation')
 
 class GoogleConfig:
     GOOGLE_ID: str = getenv('GOOGLE_CLIENT_ID')
@@ -22,10 +26,38 @@ class Secrets:
 class EmailConfig:
     FROM_EMAIL: str = getenv('FROM_EMAIL')
     PASSWORD: str = getenv('PASSWORD')
+    SMTP_HOST: str = getenv('SMTP_HOST', 'smtp.gmail.com')
+    SMTP_PORT: int = int(getenv('SMTP_PORT', 587))
+    SMTP_STARTTLS: bool = getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+    SMTP_TIMEOUT: float = float(getenv('SMTP_TIMEOUT', 30))
+    # Sessions open at the same time, and seconds an unused one is kept before reconnecting
+    SMTP_POOL_SIZE: int = int(getenv('SMTP_POOL_SIZE', 4))
+    SMTP_IDLE_TIMEOUT: float = float(getenv('SMTP_IDLE_TIMEOUT', 60))
+
+class ExecutorConfig:
+    # Threads for blocking work that releases the GIL (hashing, compression, network calls of blocking libraries)
+    THREAD_WORKERS: int = int(getenv('EXECUTOR_THREAD_WORKERS', min(32, (cpu_count() or 1) + 4)))
+    # Processes for pure-Python CPU work, 0 runs that work in the thread pool instead
+    PROCESS_WORKERS: int = int(getenv('EXECUTOR_PROCESS_WORKERS', cpu_count() or 1))
+    # Tasks of one type running at once in every process, as "type=limit,type=limit"
+    TASK_LIMITS: dict[str, int] = {task_type.strip(): int(limit) for task_type, limit in (
+        item.split('=') for item in getenv('EXECUTOR_TASK_LIMITS', 'password=8').split(',') if item.strip())}
+    DEFAULT_TASK_LIMIT: int = int(getenv('EXECUTOR_DEFAULT_TASK_LIMIT', 8))
 
 class AppConfig:
     PRODUCTION: bool = getenv('MODE') == 'production'
 
+class HTTPConfig:
+    HTTP2: bool = getenv('HTTP_CLIENT_HTTP2', 'true').lower() == 'true'
+    TIMEOUT: float = float(getenv('HTTP_CLIENT_TIMEOUT', 10))
+    CONNECT_TIMEOUT: float = float(getenv('HTTP_CLIENT_CONNECT_TIMEOUT', 5))
+    MAX_CONNECTIONS: int = int(getenv('HTTP_CLIENT_MAX_CONNECTIONS', 100))
+    MAX_CONNECTIONS_PER_HOST: int = int(getenv('HTTP_CLIENT_MAX_CONNECTIONS_PER_HOST', 20))
+    MAX_KEEPALIVE_CONNECTIONS: int = int(getenv('HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS', 20))
+    KEEPALIVE_EXPIRY: float = float(getenv('HTTP_CLIENT_KEEPALIVE_EXPIRY', 30))
+    RETRIES: int = int(getenv('HTTP_CLIENT_RETRIES', 2))
+    BACKOFF: float = float(getenv('HTTP_CLIENT_BACKOFF', 0.2))
+
 # -------------------------------------------------------------------------- URLS -------------------------------------------------------------------
 
 _FRONTEND_LOCAL_URL = ["http://localhost:3000", "http://127.0.0.1:3000"]
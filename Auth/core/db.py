@@ -1,12 +1,36 @@
-import redis
-from pymongo.mongo_client import MongoClient
+from typing import Optional
+import redis.asyncio as redis
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
 from pymongo.server_api import ServerApi
 from core.config import DBConfig, RedisConfig
 
-_client = MongoClient(DBConfig.MONGODB_URI, server_api=ServerApi('1'))
-users_db = _client['users']['users']
+class Database:
+    """Async Mongo and Redis clients shared by every router, opened and closed by the app lifespan"""
 
-redis_client = redis.Redis(
-  host=RedisConfig.REDIS_URL,
-  port=RedisConfig.REDIS_PORT,
-  password=RedisConfig.REDIS_PASSWORD)
\ No newline at end of file
+    def __init__(self) -> None:
+        self.mongo_client: Optional[AsyncIOMotorClient] = None
+        self.redis: Optional[redis.Redis] = None
+
+    async def connect(self) -> None:
+        self.mongo_client = AsyncIOMotorClient(
+            DBConfig.MONGODB_URI,
+            server_api=ServerApi('1'),
+            maxPoolSize=DBConfig.MAX_POOL_SIZE,
+            minPoolSize=DBConfig.MIN_POOL_SIZE)
+        self.redis = redis.Redis(
+            host=RedisConfig.REDIS_URL,
+            port=RedisConfig.REDIS_PORT,
+            password=RedisConfig.REDIS_PASSWORD,
+            max_connections=RedisConfig.MAX_CONNECTIONS)
+
+    async def close(self) -> None:
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    @property
+    def users_db(self) -> AsyncIOMotorCollection:
+        return self.mongo_client['users']['users']
+
+db = Database()
@@ -0,0 +1,113 @@
+import time
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+from core.config import ExecutorConfig
+
+class Executors:
+    """Thread and process pools for the blocking work of the endpoints, so it never runs on the event loop.
+
+    Threads are for work that releases the GIL (hashing, blocking network calls), processes for pure-Python
+    CPU work that would hold the GIL and stall every other request of the worker. Every task has a type with
+    its own concurrency limit (ExecutorConfig.TASK_LIMITS), so one kind of work cannot take all the workers:
+    callers above the limit wait in line and are counted in stats(). Process tasks must be picklable
+    module-level functions.
+    """
+
+    def __init__(self) -> None:
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        # False once process workers turned out to be disabled or unsupported, their tasks then run in threads
+        self._processes_available = True
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._stats: dict[str, dict] = {}
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=ExecutorConfig.THREAD_WORKERS, thread_name_prefix="executor")
+        return self._threads
+
+    def _process_pool(self) -> Optional[ProcessPoolExecutor]:
+        """None when process workers are disabled (EXECUTOR_PROCESS_WORKERS=0) or the platform cannot run them,
+        e.g. serverless runtimes without /dev/shm for the multiprocessing locks"""
+        if self._processes is None and self._processes_available:
+            if ExecutorConfig.PROCESS_WORKERS <= 0:
+                self._processes_available = False
+                return None
+            try:
+                # Forking a process that runs an event loop and threads is unsafe, workers start from a clean fork server
+                self._processes = ProcessPoolExecutor(max_workers=ExecutorConfig.PROCESS_WORKERS,
+                                                      mp_context=multiprocessing.get_context("forkserver"))
+            except (OSError, ImportError, NotImplementedError, ValueError) as e:
+                print(f"Process pool unavailable, CPU tasks will run in threads: {e}")
+                self._processes_available = False
+        return self._processes
+
+    def limit(self, task_type: str) -> int:
+        return ExecutorConfig.TASK_LIMITS.get(task_type, ExecutorConfig.DEFAULT_TASK_LIMIT)
+
+    async def _run(self, pool: Executor, task_type: str, func: Callable, *args: Any) -> Any:
+        semaphore = self._limits.get(task_type)
+        if semaphore is None:
+            semaphore = self._limits[task_type] = asyncio.Semaphore(self.limit(task_type))
+        stats = self._stats.get(task_type)
+        if stats is None:
+            stats = self._stats[task_type] = {"waiting": 0, "running": 0, "max_waiting": 0, "completed": 0, "failed": 0, "busy_seconds": 0.0}
+
+        stats["waiting"] += 1
+        stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+        try:
+            await semaphore.acquire()
+        finally:
+            stats["waiting"] -= 1
+        stats["running"] += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(pool, functools.partial(func, *args))
+        except BaseException:
+            stats["failed"] += 1
+            raise
+        finally:
+            stats["running"] -= 1
+            stats["busy_seconds"] += time.perf_counter() - started
+            semaphore.release()
+        stats["completed"] += 1
+        return result
+
+    async def run_thread(self, task_type: str, func: Callable, *args: Any) -> Any:
+        """func(*args) in the thread pool, for work that releases the GIL"""
+        return await self._run(self._thread_pool(), task_type, func, *args)
+
+    async def run_process(self, task_type: str, func: Callable, *args: Any) -> Any:
+        """func(*args) in the process pool, for pure-Python CPU work, or in the thread pool without process workers"""
+        pool = self._process_pool()
+        if pool is None:
+            return await self._run(self._thread_pool(), task_type, func, *args)
+        try:
+            return await self._run(pool, task_type, func, *args)
+        except BrokenProcessPool:
+            # A worker process died, the next task gets a fresh pool
+            if self._processes is pool:
+                self._processes = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    def stats(self) -> dict:
+        """Waiting and running tasks (the queue depth) and totals per task type"""
+        return {
+            "thread_workers": ExecutorConfig.THREAD_WORKERS,
+            "process_workers": ExecutorConfig.PROCESS_WORKERS if self._processes_available else 0,
+            "tasks": {task_type: {**stats, "limit": self.limit(task_type), "busy_seconds": round(stats["busy_seconds"], 3)}
+                      for task_type, stats in self._stats.items()},
+        }
+
+    def shutdown(self) -> None:
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
+
+executors = Executors()
@@ -0,0 +1,61 @@
+import random
+import asyncio
+from typing import Optional
+import httpx
+from core.config import HTTPConfig
+
+class HTTPClient:
+    """App-lifetime async HTTP client shared by every upstream call.
+
+    Keeps connections alive (HTTP/2 where the upstream supports it), caps concurrent requests per host
+    and retries transient failures with exponential backoff and full jitter.
+    """
+
+    RETRY_STATUS_CODES = {429, 502, 503, 504}
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self) -> None:
+        self.client: Optional[httpx.AsyncClient] = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async def connect(self) -> None:
+        self.client = httpx.AsyncClient(
+            http2=HTTPConfig.HTTP2,
+            timeout=httpx.Timeout(HTTPConfig.TIMEOUT, connect=HTTPConfig.CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTPConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=HTTPConfig.MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTPConfig.KEEPALIVE_EXPIRY))
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = httpx.URL(url).host
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(HTTPConfig.MAX_CONNECTIONS_PER_HOST)
+        return self._host_limits[host]
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        # Non idempotent requests are only retried when the connection could not be opened
+        retryable = method.upper() in self.IDEMPOTENT_METHODS
+        for attempt in range(HTTPConfig.RETRIES + 1):
+            last_attempt = attempt == HTTPConfig.RETRIES
+            try:
+                async with self._host_limit(url):
+                    response = await self.client.request(method, url, **kwargs)
+                if last_attempt or not retryable or response.status_code not in self.RETRY_STATUS_CODES:
+                    return response
+            except httpx.TransportError as e:
+                if last_attempt or not (retryable or isinstance(e, httpx.ConnectError)):
+                    raise
+            await asyncio.sleep(random.uniform(0, HTTPConfig.BACKOFF * 2 ** attempt))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+http_client = HTTPClient()
@@ -0,0 +1,87 @@
+import time
+import smtplib
+import threading
+from typing import Union
+from core.config import EmailConfig
+
+class SMTPPool:
+    """Pool of logged in SMTP sessions shared by every thread sending email.
+
+    Sessions are kept open between messages and reopened when they were idle for longer than the server is
+    likely to keep them. A session that turns out to be dead is dropped and the message is sent again on a
+    fresh one. Sending is blocking, call it from a worker thread.
+    """
+
+    def __init__(self, host: str, port: int, size: int, idle_timeout: float) -> None:
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=EmailConfig.SMTP_TIMEOUT)
+        try:
+            if EmailConfig.SMTP_STARTTLS:
+                connection.starttls()
+            if EmailConfig.PASSWORD:
+                connection.login(EmailConfig.FROM_EMAIL, EmailConfig.PASSWORD)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    @staticmethod
+    def _discard(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        connection, stale = None, []
+        with self._lock:
+            while self._idle and connection is None:
+                candidate, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.idle_timeout:
+                    connection = candidate
+                else:
+                    stale.append(candidate)
+        for candidate in stale:
+            self._discard(candidate)
+        return connection or self._connect()
+
+    def _checkin(self, connection: smtplib.SMTP) -> None:
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    def send(self, message: bytes, to_addrs: Union[str, list[str]]) -> dict:
+        """Send the message to every recipient in a single transaction, returns the recipients the server
+        refused (see smtplib.SMTP.sendmail), raises if it refused all of them"""
+        with self._slots:
+            for attempt in range(2):
+                connection = self._checkout()
+                try:
+                    refused = connection.sendmail(from_addr=EmailConfig.FROM_EMAIL, to_addrs=to_addrs, msg=message)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                    # Refused by the server, smtplib already reset the transaction so the session stays usable
+                    self._checkin(connection)
+                    raise
+                except OSError:
+                    # Any other failure (SMTP errors are OSErrors too), likely a session dropped by the server
+                    # while idle, a fresh one gets one more try
+                    connection.close()
+                    if attempt:
+                        raise
+                else:
+                    self._checkin(connection)
+                    return refused
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+smtp_pool = SMTPPool(EmailConfig.SMTP_HOST, EmailConfig.SMTP_PORT, EmailConfig.SMTP_POOL_SIZE, EmailConfig.SMTP_IDLE_TIMEOUT)
@@ -1,6 +1,7 @@
 import re
-import smtplib
+from typing import Union
 from core.config import EmailConfig
+from core.smtp_pool import smtp_pool
 
 def validate_email(email: str) -> bool:
     email_regex = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
@@ -14,8 +15,6 @@ def create_email_message(from_user: str, msg: str, subject: str) -> str:
     message = message.encode('utf-8')
     return message
 
-def send_email(message: str, to_user: str) -> None:
-    with smtplib.SMTP("smtp.gmail.com", 587) as connection:
-        connection.starttls()
-        connection.login(EmailConfig.FROM_EMAIL, EmailConfig.PASSWORD)
-        connection.sendmail(from_addr=EmailConfig.FROM_EMAIL, to_addrs=to_user, msg=message)
\ No newline at end of file
+def send_email(message: str, to_user: Union[str, list[str]]) -> dict:
+    """Blocking, sends to every recipient in one transaction over a pooled session and returns the refused ones"""
+    return smtp_pool.send(message, to_user)
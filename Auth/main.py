@@ -1,12 +1,32 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from auth.endpoints import router
+from auth.utils import remove_expired
+from core.db import db
+from core.http_client import http_client
+from core.smtp_pool import smtp_pool
+from core.executors import executors
 from core.config import URLS, Messages
 from fastapi.responses import ORJSONResponse
 
 # ----------------------------------------------- App Initialization ----------------------------------------------------------------------
 
-app = FastAPI(redoc_url=None, docs_url=None)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    await http_client.connect()
+    # Background task to remove expired tokens and unverified users from DB
+    cleanup_task = asyncio.create_task(remove_expired())
+    yield
+    cleanup_task.cancel()
+    smtp_pool.close()
+    executors.shutdown()
+    await http_client.close()
+    await db.close()
+
+app = FastAPI(redoc_url=None, docs_url=None, lifespan=lifespan)
 
 # ----------------------------------------------- Enable CORS for all origins -------------------------------------------------------------
 